@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Qidiruv takliflari indeksi so'rov ichida qurilmaydi: jarayon ishga tushishi bilan fonda quriladi.
+# Mashhurlik hisoblagichlari bo'sh turgan worker'da ham FLUSH_INTERVAL'da yoziladi
+from main.counters import popularity
+from main.suggestions import suggestions
+
+suggestions.refresh()
+popularity.start()
@@ -0,0 +1,102 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+
+_routing = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+def current_state():
+    state = _routing.get()
+    if state is None:
+        state = RoutingState()
+        _routing.set(state)
+    return state
+
+
+def pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(pin_key(user.pk)))
+
+
+def use_replica_for(request):
+    """Route this request's reads to a replica unless the user recently wrote."""
+    if settings.REPLICA_DATABASES and not is_pinned(request.user):
+        current_state().use_replica = True
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes always go to ``default``. Reads go to a replica only inside
+    requests that opted in through ``use_replica_for`` and have not
+    written anything yet.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = current_state()
+        if state.use_replica and not state.wrote and settings.REPLICA_DATABASES:
+            return random.choice(settings.REPLICA_DATABASES)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        current_state().wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.REPLICA_DATABASES
+
+
+class ReplicaPinMiddleware:
+    """Pins a user to the primary for REPLICA_PIN_SECONDS after any request that wrote."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+            user = getattr(request, 'user', None)
+            if state.wrote and user is not None and user.is_authenticated:
+                cache.set(pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+            return response
+        finally:
+            _routing.reset(token)
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+            user = getattr(request, 'user', None)
+            if state.wrote and isinstance(user, SimpleLazyObject):
+                # Session user'i lazy: async kontekstda faqat auser() orqali (DRF o'rnatgan user esa tayyor obyekt)
+                user = await request.auser()
+            if state.wrote and user is not None and user.is_authenticated:
+                await cache.aset(pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+            return response
+        finally:
+            _routing.reset(token)
@@ -0,0 +1,69 @@
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from main.middleware import precompress
+
+info = openapi.Info(
+   title="Market API",
+   default_version='v1',
+   description="Test",
+   terms_of_service="https://www.google.com/policies/terms/",
+   contact=openapi.Contact(email="contact@snippets.local"),
+   license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(
+   info,
+   public=True,
+   permission_classes=(permissions.AllowAny,),
+)
+
+_schema = {}
+_schema_lock = threading.Lock()
+
+
+def build_schema():
+    """Full OpenAPI document as JSON bytes; introspects every view and serializer."""
+    # Anonim so'rov nomidan: view'lar get_queryset'da request.user'ga murojaat qiladi.
+    # url='' -- host yozilmaydi, UI sxemani qaysi domendan olgan bo'lsa o'shani ishlatadi
+    request = APIView().initialize_request(APIRequestFactory().get('/openapi.json'))
+    generator = schema_view.generator_class(info, url='')
+    return OpenAPICodecJson(validators=[]).encode(generator.get_schema(request=request, public=True))
+
+
+def load_schema():
+    """
+    The file written by ``manage.py generate_schema`` at deploy time, or a
+    schema built once per process when the file is missing.
+    """
+    if not _schema:
+        with _schema_lock:
+            if not _schema:
+                try:
+                    content = settings.OPENAPI_SCHEMA_FILE.read_bytes()
+                except FileNotFoundError:
+                    content = build_schema()
+                _schema.update(content=content, encodings=precompress(content, 'application/json', best=True))
+    return _schema
+
+
+class OpenAPISchemaView(View):
+    def get(self, request):
+        schema = load_schema()
+        response = HttpResponse(schema['content'], content_type='application/json')
+        response.precompressed = schema['encodings']
+        return response
+
+
+def index(request):
+    # Crawler va health check'lar uchun: DB ham, schema ham kerak emas
+    return JsonResponse({'status': 'ok', 'docs': request.build_absolute_uri('/docs/')})
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.ConcurrencyLimitMiddleware',
+    'main.middleware.CompressionMiddleware',
+    'core.routers.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,12 +62,23 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Bir jarayonda bir vaqtda bajarilayotgan so'rovlar chegarasi; oshsa 503 + Retry-After
+CONCURRENCY_LIMIT = {
+    "MAX_IN_FLIGHT": 32,
+    "QUEUE_TIMEOUT": 0.1,
+    "RETRY_AFTER": 1,
+    # Uzoq ushlab turiladigan so'rovlar (long-poll, SSE) slot egallamasin
+    "EXEMPT_PATHS": ['/messages/poll/', '/messages/stream/'],
+}
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 ROOT_URLCONF = 'core.urls'
 
 
 SWAGGER_SETTINGS = {
+   # UI sxemani har safar qayta qurmaydi, tayyor /openapi.json'ni o'qiydi
+   'SPEC_URL': 'openapi-schema',
    'SECURITY_DEFINITIONS': {
       'Basic': {
             'type': 'basic'
@@ -75,17 +90,34 @@ SWAGGER_SETTINGS = {
       }
    }
 }
+# manage.py generate_schema deploy paytida yozadi; fayl bo'lmasa sxema jarayonda bir marta quriladi
+OPENAPI_SCHEMA_FILE = BASE_DIR / 'openapi.json'
 
 REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
 
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'main.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
 
          'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    # orjson o'rnatilgan bo'lsa tezkor JSON, aks holda DRF'ning standart json'i
+    'DEFAULT_RENDERER_CLASSES': [
+        'main.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'main.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Yozish endpointlari uchun qat'iy oynali hisoblagich (main.throttling): '60/min' = har daqiqada 60 tagacha
+    'DEFAULT_THROTTLE_RATES': {
+        'user_writes': '60/min',
+        'ip_writes': '120/min',
+    },
 
 }
 
@@ -93,7 +125,29 @@ from datetime import timedelta
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=30),
-    "REFRESH_TOKEN_LIFETIME": timedelta(days=180)
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=180),
+    "TOKEN_OBTAIN_SERIALIZER": "main.serializers.TokenObtainPairWithClaimsSerializer",
+}
+
+# User versiyasi umumiy cache'da bo'lishi kerak (REDIS_URL): LocMem bilan o'chirilgan user
+# boshqa worker'larda TIMEOUT tugaguncha autentifikatsiyadan o'tadi
+JWT_USER_CACHE = {
+    "TIMEOUT": 300,
+    "LOCAL_MAXSIZE": 1024,
+    "LOCAL_TIMEOUT": 30,
+}
+
+CART_RESERVATION_TIMEOUT = timedelta(minutes=15)
+
+# /messages/poll/ va /messages/stream/ (ASGI ostida ishlatish kerak). Yangi xabar markeri umumiy
+# cache'da turadi (REDIS_URL); LocMem bilan boshqa worker'dagi xabarlar faqat DB_CHECK_TICKS'da ko'rinadi
+MESSAGE_STREAM = {
+    "POLL_INTERVAL": 1,
+    "DB_CHECK_TICKS": 5,
+    "LONG_POLL_TIMEOUT": 25,
+    "STREAM_TIMEOUT": 300,
+    "HEARTBEAT": 15,
+    "BATCH_SIZE": 100,
 }
 
 TEMPLATES = [
@@ -130,14 +184,138 @@ JAZZMIN_SETTINGS = {
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DB_ENGINE=postgres production uchun, aks holda WAL rejimidagi SQLite
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+# Har bir yangi ulanishda bajariladi: WAL o'quvchilarni yozuvchidan ajratadi,
+# synchronous=NORMAL WAL bilan xavfsiz va har commit'da fsync qilmaydi
+SQLITE_INIT_COMMAND = 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL'
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'market'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # .iterator() server-side cursor ishlatadi; pgbouncer transaction pooling ortida o'chiring
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            # Checkout yozuvlari lock uchun kutadi, darhol "database is locked" xatosi bermaydi
+            'OPTIONS': {
+                'timeout': int(os.environ.get('DB_BUSY_TIMEOUT', 20)),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': SQLITE_INIT_COMMAND,
+            },
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+
+
+# Read replicas
+# DB_REPLICAS: postgres uchun host'lar, sqlite uchun fayl yo'llari (vergul bilan).
+# Lokal sinov: cp db.sqlite3 replica.sqlite3 && DB_REPLICAS=replica.sqlite3
+
+REPLICA_DATABASES = []
+for index, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica_{index}'
+    location = {'HOST': replica} if DB_ENGINE == 'postgres' else {'NAME': replica}
+    DATABASES[alias] = dict(DATABASES['default'], **location, TEST={'MIRROR': 'default'})
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Foydalanuvchi yozgandan keyin shuncha soniya uning o'qishlari ham primary'dan
+REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# REDIS_URL berilsa barcha worker'lar uchun umumiy cache, aks holda process ichidagi LocMem
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Katalog GET javoblari shu muddatgacha cache'da (har qanday katalog o'zgarishi versiyani yangilaydi)
+CATALOG_CACHE_TIMEOUT = 300
+
+# Mahsulot mashhurlik hisoblagichlari jarayon xotirasida yig'ilib, shu oraliqda yoziladi (main.counters)
+POPULARITY_COUNTERS = {
+    "FLUSH_INTERVAL": 5,
+    "MAX_PENDING": 1000,
+}
+
+# Mahsulot kartochkasining foydalanuvchiga bog'liq bo'lmagan qismi (main.fragments), mahsulot versiyasi bilan kalitlanadi
+PRODUCT_FRAGMENTS = {
+    "TIMEOUT": 60 * 60,
+    "LOCAL_SIZE": 4096,
+    "LOCAL_TIMEOUT": 60,
+}
+
+# /suggestions/: jarayon xotirasidagi prefiks indeksi (main.suggestions)
+SUGGESTIONS = {
+    "LIMIT": 10,
+    "MAX_LIMIT": 50,
+    "MIN_PREFIX": 2,
+    "REBUILD_INTERVAL": 600,
+}
+
+# manage.py warm_cache: deploydan keyin eng ko'p so'raladigan javoblar oldindan cache'ga yoziladi.
+# HOST rasm URL'lari to'g'ri chiqishi uchun sayt domeni bo'lishi kerak
+CACHE_WARMUP = {
+    # Katalog cache kaliti sxema va host bilan quriladi: public host (va SECURE) aynan foydalanuvchilar
+    # so'raydigan bo'lishi shart, aks holda isitilgan yozuvlar hech kimga tushmaydi
+    "HOST": os.environ.get('CACHE_WARMUP_HOST'),
+    "SECURE": os.environ.get('CACHE_WARMUP_SECURE') == '1',
+    "WORKERS": 8,
+    "TIME_BUDGET": 60,
+    "TOP_PRODUCTS": 100,
+}
+
+# compute_recommendations: har bir mahsulot uchun saqlanadigan qo'shnilar soni
+RECOMMENDATIONS = {
+    "TOP_K": 10,
+    "MAX_BASKET_SIZE": 100,
 }
 
+# Response compression (brotli paketi o'rnatilgan bo'lsa br, aks holda gzip).
+# text/html yo'q: admin va browsable API sahifalarida CSRF token kiritilgan matn yonida turadi (BREACH)
+COMPRESS_MIN_SIZE = 512
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5
+COMPRESS_CONTENT_TYPES = [
+    'application/json',
+    'application/javascript',
+    'text/css',
+    'text/plain',
+    'image/svg+xml',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -183,6 +361,23 @@ else:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Media fayllar sha256 bo'yicha nomlanadi va modellar o'rtasida bo'lishiladi (main.storage)
+STORAGES = {
+    "default": {"BACKEND": "main.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Bo'laklab yuklash: vaqtinchalik fayllar MEDIA_ROOT bilan bir diskda turishi kerak,
+# yakunlanganda fayl nusxalanmasdan os.replace bilan ko'chiriladi
+CHUNKED_UPLOADS = {
+    "TEMP_DIR": MEDIA_ROOT / 'partial',
+    "MAX_SIZE": 2 * 1024 ** 3,
+    "MAX_CHUNK_SIZE": 8 * 1024 ** 2,
+    "EXPIRES": timedelta(days=1),
+    # Bo'lak yozish uchun claim; jarayon o'lsa shundan keyin bo'lakni qayta yuborish mumkin
+    "CHUNK_TIMEOUT": timedelta(minutes=10),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,28 +1,17 @@
 from django.contrib import admin
 from django.urls import path
-from drf_yasg.views import get_schema_view
 from rest_framework_simplejwt.views import token_obtain_pair , token_refresh
 from main.views import *
 from django.conf import settings
 from django.conf.urls.static import static
 from main.models import *
-
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Market API",
-      default_version='v1',
-      description="Test",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@snippets.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
+from core.schema import OpenAPISchemaView, index, schema_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('', index, name='index'),
+    path('docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('openapi.json', OpenAPISchemaView.as_view(), name='openapi-schema'),
 
 ]
 
@@ -39,10 +28,15 @@ urlpatterns += [
     path('categories/', CategoryListAPIView.as_view(), name='category-list-create'),
     path('categories/create', CategoryCreateAPIView.as_view(),),
     path('categories/<int:pk>/', CategoryRetrieveUpdateAPIView.as_view(), name='category-detail'),
+    path('navigation/', NavigationAPIView.as_view(), name='navigation'),
+    path('suggestions/', SuggestionView.as_view(), name='suggestions'),
     path('products/', ProductListAPIView.as_view(), name='product-list-create'),
     path('products/filter/' , FilterProductAPIView.as_view(), name='product-filter'),
     path('products/create/', ProductCreateAPIView.as_view() ),
+    path('products/bulk-price/', ProductBulkPriceAPIView.as_view(), name='product-bulk-price'),
     path('products/<int:pk>/', ProductRetrieveUpdateDestroyAPIView.as_view(), name='product-detail'),
+    path('products/<int:pk>/page/', ProductPageAPIView.as_view(), name='product-page'),
+    path('products/<int:pk>/recommendations/', ProductRecommendationsAPIView.as_view(), name='product-recommendations'),
     path('images/', ImageListAPIView.as_view(), name='image-list-create'),
     path('images/craete', ImageCreateAPIView.as_view()),
     path('images/<int:pk>/', ImageDetailAPIView.as_view(), name='image-detail'),
@@ -63,7 +57,12 @@ urlpatterns += [
     path('versus-items/<int:pk>/', VersusItemDetailAPIView.as_view(), name='versusitem-detail'),
     path('messages/', MessageListAPIView.as_view(), name='message-list-create'),
     path('messages/create/', MessageCreateAPIView.as_view(), ),
+    path('messages/poll/', MessagePollView.as_view(), name='message-poll'),
+    path('messages/stream/', MessageStreamView.as_view(), name='message-stream'),
     path('messages/<int:pk>/', MessageDetailAPIView.as_view(), name='message-detail'),
+    path('uploads/', UploadCreateAPIView.as_view(), name='upload-create'),
+    path('uploads/<uuid:pk>/', UploadDetailAPIView.as_view(), name='upload-detail'),
+    path('uploads/<uuid:pk>/finalize/', UploadFinalizeAPIView.as_view(), name='upload-finalize'),
     path('property-types/', PropertyTypeListCreateView.as_view(), name='property-type-list-create'),
     path('property-types/<int:pk>/', PropertyTypeDetailView.as_view(), name='property-type-detail'),
     path('properties/', PropertyListCreateView.as_view(), name='property-list-create'),
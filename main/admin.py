@@ -1,16 +1,32 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.widgets import AdminDateWidget, AutocompleteSelect
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Count, F
+from django.forms.models import BaseInlineFormSet
 from .models import (
     User, Category, Galary, Brand, Product, Image,
     PropertyType, Property, CartItem, Order, OrderItem,
     LikedItem, VersusItem, Message
 )
+from .pagination import EstimatedCountPaginator
+from .pricing import adjust_prices, clear_discount, set_discount
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    # Katta jadvallarda ikkinchi COUNT(*) va aniq sanashdan qochish
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'isadmin', 'phone_number', 'card_number', 'is_staff')
     search_fields = ('username', 'email', 'phone_number')
     list_filter = ('isadmin', 'is_staff')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Qo‘shimcha maʼlumotlar', {
             'fields': ('image', 'phone_number', 'card_number', 'isadmin'),
@@ -30,73 +46,194 @@ class GalaryAdmin(admin.ModelAdmin):
 class BrandAdmin(admin.ModelAdmin):
     list_display = ('name', 'category')
     list_filter = ('category',)
+    list_select_related = ('category',)
     search_fields = ('name',)
+    autocomplete_fields = ('category',)
 
 class ImageInline(admin.TabularInline):
     model = Image
     extra = 1
 
+    def get_queryset(self, request):
+        # Image.__str__ mahsulot nomini o'qiydi
+        return super().get_queryset(request).select_related('product')
+
 class PropertyTypeInline(admin.TabularInline):
     model = PropertyType
     extra = 1
 
+class ProductPriceActionForm(ActionForm):
+    percent = forms.FloatField(label='Foiz', required=False)
+    until = forms.DateField(label='Tugash sanasi', required=False, widget=AdminDateWidget)
+
+
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'monthly_price', 'is_cash', 'discount', 'brand', 'category')
+class ProductAdmin(ScalableAdmin):
+    list_display = ('name', 'price', 'monthly_price', 'is_cash', 'discount', 'effective_price', 'stock', 'brand', 'category')
     list_filter = ('is_cash', 'brand', 'category')
+    list_select_related = ('brand', 'category')
     search_fields = ('name',)
+    autocomplete_fields = ('brand', 'category')
+    raw_id_fields = ('galary',)
     inlines = [ImageInline, PropertyTypeInline]
+    # Brend/kategoriya bo'yicha filtrlab "hammasini tanlash" -- butun guruh bitta UPDATE bilan
+    action_form = ProductPriceActionForm
+    actions = ['set_discount', 'clear_discount', 'adjust_price']
+
+    def get_percent(self, request, low, high=None):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        percent = form.cleaned_data.get('percent') if form.is_valid() else None
+        if percent is None or percent <= low or (high is not None and percent >= high):
+            self.message_user(request, "Foizni to'g'ri kiriting.", messages.ERROR)
+            return None, None
+        return percent, form.cleaned_data.get('until')
+
+    @admin.action(description="Chegirma qo'yish (foiz, tugash sanasi)")
+    def set_discount(self, request, queryset):
+        percent, until = self.get_percent(request, 0, 100)
+        if percent is not None:
+            updated = set_discount(queryset, percent, until)
+            self.message_user(request, f"{updated} ta mahsulotga {percent:g}% chegirma qo'yildi.")
+
+    @admin.action(description="Chegirmani olib tashlash")
+    def clear_discount(self, request, queryset):
+        updated = clear_discount(queryset)
+        self.message_user(request, f"{updated} ta mahsulotdan chegirma olib tashlandi.")
+
+    @admin.action(description="Narxni foizga o'zgartirish")
+    def adjust_price(self, request, queryset):
+        percent, _ = self.get_percent(request, -100)
+        if percent is not None:
+            updated = adjust_prices(queryset, percent)
+            self.message_user(request, f"{updated} ta mahsulot narxi {percent:+g}% ga o'zgartirildi.")
 
 @admin.register(Image)
-class ImageAdmin(admin.ModelAdmin):
+class ImageAdmin(ScalableAdmin):
     list_display = ('product', 'main')
     list_filter = ('main',)
+    list_select_related = ('product',)
     search_fields = ('product__name',)
+    autocomplete_fields = ('product',)
 
 class PropertyInline(admin.TabularInline):
     model = Property
     extra = 1
 
 @admin.register(PropertyType)
-class PropertyTypeAdmin(admin.ModelAdmin):
+class PropertyTypeAdmin(ScalableAdmin):
     list_display = ('title', 'product')
+    list_select_related = ('product',)
+    search_fields = ('title', 'product__name')
+    autocomplete_fields = ('product',)
     inlines = [PropertyInline]
 
 @admin.register(Property)
-class PropertyAdmin(admin.ModelAdmin):
+class PropertyAdmin(ScalableAdmin):
     list_display = ('title', 'value', 'property_type')
+    list_select_related = ('property_type',)
+    autocomplete_fields = ('property_type',)
 
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
-    list_display = ('user', 'product', 'amount', 'created_at')
+class CartItemAdmin(ScalableAdmin):
+    list_display = ('user', 'product', 'amount', 'reserved_until', 'created_at')
     list_filter = ('created_at',)
+    list_select_related = ('user', 'product')
     search_fields = ('user__username', 'product__name')
+    autocomplete_fields = ('user', 'product')
+
+class JoinedAutocompleteSelect(AutocompleteSelect):
+    """
+    AutocompleteSelect that takes the selected option's label from ``labels``
+    (filled from rows that were already loaded with select_related) instead
+    of running one query per inline row.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.labels = {}
+
+    def optgroups(self, name, value, attr=None):
+        selected = [str(v) for v in value if str(v) not in self.choices.field.empty_values]
+        if not selected or any(v not in self.labels for v in selected):
+            return super().optgroups(name, value, attr)
+
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for v in selected:
+            options.append(self.create_option(name, v, self.labels[v], set(selected), len(options)))
+        return [(None, options, 0)]
+
+
+class OrderItemFormSet(BaseInlineFormSet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        widget = self.form.base_fields['product'].widget.widget
+        for item in self.get_queryset():
+            widget.labels[str(item.product_id)] = str(item.product)
+
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
+    formset = OrderItemFormSet
     extra = 1
+    autocomplete_fields = ('product',)
+
+    def get_queryset(self, request):
+        # OrderItem.__str__ va product maydoni mahsulotni o'qiydi
+        return super().get_queryset(request).select_related('product')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'product':
+            kwargs['widget'] = JoinedAutocompleteSelect(db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ('user', 'total_price', 'status', 'created_at')
+class OrderAdmin(ScalableAdmin):
+    list_display = ('user', 'total_price', 'items_count', 'status', 'created_at')
     list_filter = ('status', 'created_at')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'phone_number', 'region', 'city')
+    autocomplete_fields = ('user',)
     inlines = [OrderItemInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(items_count=Count('orderitem'))
+
+    @admin.display(ordering='items_count')
+    def items_count(self, obj):
+        return obj.items_count
+
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(ScalableAdmin):
     list_display = ('order', 'product', 'amount', 'total_price', 'created_at')
+    list_select_related = ('order__user', 'product')
     search_fields = ('order__user__username', 'product__name')
+    autocomplete_fields = ('order', 'product')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(line_total=F('amount') * F('product__price'))
+
+    @admin.display(ordering='line_total')
+    def total_price(self, obj):
+        return obj.line_total
 
 @admin.register(LikedItem)
-class LikedItemAdmin(admin.ModelAdmin):
+class LikedItemAdmin(ScalableAdmin):
     list_display = ('user', 'product')
+    list_select_related = ('user', 'product')
+    autocomplete_fields = ('user', 'product')
 
 @admin.register(VersusItem)
-class VersusItemAdmin(admin.ModelAdmin):
+class VersusItemAdmin(ScalableAdmin):
     list_display = ('user', 'product', 'category')
+    list_select_related = ('user', 'product', 'category')
+    autocomplete_fields = ('user', 'product', 'category')
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(ScalableAdmin):
     list_display = ('user', 'message', 'created_at')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'message')
+    autocomplete_fields = ('user',)
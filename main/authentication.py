@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import LocalLRUCache, get_version
+
+
+# Autentifikatsiya uchun yetarli maydonlar; parol xeshi va shaxsiy ma'lumotlar cache'ga tushmaydi
+CACHED_USER_FIELDS = ('id', 'username', 'is_active', 'isadmin')
+
+local_users = LocalLRUCache(
+    maxsize=settings.JWT_USER_CACHE['LOCAL_MAXSIZE'],
+    timeout=settings.JWT_USER_CACHE['LOCAL_TIMEOUT'],
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user from a local LRU and the shared
+    cache before the database. Only ``CACHED_USER_FIELDS`` are cached and each
+    request gets a fresh ``User`` with the other fields deferred. Entries are
+    keyed by the user's cache version, which ``main.signals`` bumps whenever
+    the user row is saved or deleted.
+
+    The bump needs a shared cache (REDIS_URL): with LocMem it stays in the
+    worker that saved the user, and a deactivated user remains authenticated
+    in the other workers until ``JWT_USER_CACHE['TIMEOUT']`` expires.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = f'jwt-user:{user_id}:{get_version(f"user:{user_id}")}'
+        values = local_users.get(key)
+        if values is None:
+            values = cache.get(key)
+            if values is None:
+                # Faol bo'lmagan yoki topilmagan user uchun xato shu yerda chiqadi va cache'ga tushmaydi
+                user = super().get_user(validated_token)
+                values = tuple(getattr(user, name) for name in CACHED_USER_FIELDS)
+                cache.set(key, values, settings.JWT_USER_CACHE['TIMEOUT'])
+            local_users.set(key, values)
+
+        # Har bir request o'z nusxasini oladi, view'dagi o'zgarishlar cache'ga yozilmaydi
+        return self.user_model.from_db(None, CACHED_USER_FIELDS, values)
+
+
+class JWTClaimsAuthentication(JWTStatelessUserAuthentication):
+    """
+    Claims-only authentication for read endpoints: ``request.user`` is a
+    TokenUser exposing ``id`` and ``isadmin`` straight from the token. Tokens
+    issued before the ``isadmin`` claim existed fall back to the cached user.
+    """
+
+    def get_user(self, validated_token):
+        if 'isadmin' not in validated_token:
+            return CachedJWTAuthentication().get_user(validated_token)
+        return super().get_user(validated_token)
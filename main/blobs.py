@@ -0,0 +1,46 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+
+from .models import Blob, Brand, Category, Galary, Image, Message, User
+
+# Blob'larga murojaat qiladigan barcha fayl maydonlari
+FILE_FIELDS = {
+    User: ('image',),
+    Category: ('image', 'icon'),
+    Galary: ('image',),
+    Brand: ('image',),
+    Image: ('image',),
+    Message: ('file',),
+}
+
+
+def is_blob(name):
+    return getattr(default_storage, 'is_blob', lambda name: False)(name)
+
+
+def incref(name):
+    if not is_blob(name):
+        return
+    if not Blob.objects.filter(name=name).update(refs=F('refs') + 1):
+        _, created = Blob.objects.get_or_create(name=name, defaults={'refs': 1})
+        if not created:
+            Blob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def decref(name):
+    if not is_blob(name):
+        return
+    Blob.objects.filter(name=name, refs__gt=0).update(refs=F('refs') - 1)
+    if Blob.objects.filter(name=name, refs=0).delete()[0]:
+        transaction.on_commit(lambda: delete_orphan(name))
+
+
+def delete_orphan(name):
+    # Shu orada bir xil fayl qayta yuklangan bo'lishi mumkin
+    if not Blob.objects.filter(name=name).exists():
+        default_storage.delete(name)
+
+
+def file_names(instance, fields):
+    return {field: getattr(instance, field).name or None for field in fields}
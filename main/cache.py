@@ -0,0 +1,112 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class LocalLRUCache:
+    """Small per-process LRU with a TTL, used in front of the shared cache."""
+
+    def __init__(self, maxsize=1024, timeout=60):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key, value, timeout=None):
+        expires = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Bu backend'lar har bir jarayonda alohida: versiya bump'lari va warmup boshqa worker'larga yetib bormaydi
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared_cache(alias='default'):
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def get_version(name):
+    # Versiya tasodifiy qiymat: kalit cache'dan o'chib ketsa ham eski yozuvlar qaytib kelmaydi
+    key = f'version:{name}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex[:12], None)
+        version = cache.get(key) or uuid.uuid4().hex[:12]
+    return version
+
+
+def get_versions(names):
+    """``get_version`` for many names with one ``get_many`` round trip."""
+    keys = {f'version:{name}': name for name in names}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, uuid.uuid4().hex[:12], None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return {name: versions.get(key) or uuid.uuid4().hex[:12] for key, name in keys.items()}
+
+
+def bump_version(name):
+    cache.set(f'version:{name}', uuid.uuid4().hex[:12], None)
+
+
+def bump_versions(names):
+    cache.set_many({f'version:{name}': uuid.uuid4().hex[:12] for name in names}, None)
+
+
+def catalog_cache_key(url):
+    # To'liq URL (sxema va host bilan): javobdagi rasm va sahifalash havolalari absolyut
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f'catalog:{get_version("catalog")}:{digest}'
+
+
+def product_cache_key(pk, url):
+    # Faqat shu mahsulot o'zgarganda eskiradi (main.signals), katalogdagi boshqa o'zgarishlar ta'sir qilmaydi
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f'product:{pk}:{get_version(f"product:{pk}")}:{digest}'
+
+
+def recommendations_cache_key(url):
+    # compute_recommendations ham, katalogdagi o'zgarishlar ham eskirtiradi
+    return f'recommendations:{get_version("recommendations")}:{catalog_cache_key(url)}'
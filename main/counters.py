@@ -0,0 +1,115 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """
+    Per-process write-behind buffer for the popularity counters on
+    ``Product``. Increments are summed in memory and flushed at most every
+    ``FLUSH_INTERVAL`` seconds (or once ``MAX_PENDING`` products are
+    waiting) as ``F()`` updates, one per distinct set of deltas, so a hot
+    product costs one row update per flush instead of one per event.
+    Deltas whose UPDATE fails go back into the buffer for the next flush.
+    ``start()`` adds a timer thread so an idle worker still flushes.
+    """
+
+    def __init__(self):
+        self._pending = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._timer = None
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # Ota jarayonning buferi bolada qayta yozilmasin; timer thread fork'dan o'tmaydi
+        self._pending = defaultdict(Counter)
+        self._lock = threading.Lock()
+        if self._timer is not None:
+            self._timer = None
+            self.start()
+
+    def start(self):
+        """Flush from a daemon thread every ``FLUSH_INTERVAL`` (``core.wsgi``/``core.asgi``)."""
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Thread(target=self._run, name='popularity-flush', daemon=True)
+        self._timer.start()
+
+    def _run(self):
+        while True:
+            interval = settings.POPULARITY_COUNTERS['FLUSH_INTERVAL']
+            time.sleep(max(self._last_flush + interval - time.monotonic(), 0.1))
+            if time.monotonic() - self._last_flush < interval:
+                continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Popularity counters flush failed; deltas kept for the next attempt")
+            finally:
+                close_old_connections()
+
+    def add(self, product_id, field, amount=1):
+        options = settings.POPULARITY_COUNTERS
+        with self._lock:
+            self._pending[product_id][field] += amount
+            due = (
+                len(self._pending) >= options['MAX_PENDING']
+                or time.monotonic() - self._last_flush >= options['FLUSH_INTERVAL']
+            )
+        if due:
+            self.flush()
+
+    def add_on_commit(self, product_id, field, amount=1):
+        # Bekor qilingan tranzaksiyadagi hodisalar hisoblanmaydi
+        transaction.on_commit(lambda: self.add(product_id, field, amount))
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+            self._last_flush = time.monotonic()
+
+        groups = defaultdict(list)
+        for product_id, deltas in pending.items():
+            deltas = tuple(sorted((field, amount) for field, amount in deltas.items() if amount))
+            if deltas:
+                groups[deltas].append(product_id)
+
+        flushed = 0
+        for deltas, product_ids in list(groups.items()):
+            try:
+                Product.objects.filter(pk__in=sorted(product_ids)).update(**{
+                    field: F(field) + amount if amount > 0 else Greatest(F(field) + amount, 0)
+                    for field, amount in deltas
+                })
+            except Exception:
+                # Yozilmagan deltalar buferga qaytadi, keyingi flush qayta urinadi
+                self._restore(groups)
+                raise
+            del groups[deltas]
+            flushed += len(product_ids)
+        return flushed
+
+    def _restore(self, groups):
+        with self._lock:
+            for deltas, product_ids in groups.items():
+                for product_id in product_ids:
+                    for field, amount in deltas:
+                        self._pending[product_id][field] += amount
+
+
+popularity = CounterBuffer()
+atexit.register(popularity.flush)
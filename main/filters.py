@@ -9,9 +9,24 @@ class BrandFilter(filters.FilterSet):
         model = Brand
         fields = ['name']
 
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
 class ProductFilter(filters.FilterSet):
-    brand = filters.NumberFilter(field_name='product__brand_id')
+    brand = filters.NumberFilter(field_name='brand_id')
+    brand__in = NumberInFilter(field_name='brand_id', lookup_expr='in')
+    category = filters.NumberFilter(field_name='category_id')
+    category__in = NumberInFilter(field_name='category_id', lookup_expr='in')
+    price = filters.RangeFilter()
+    effective_price = filters.RangeFilter()
+    discount_active = filters.BooleanFilter(method='filter_discount_active')
 
     class Meta:
         model = Product
-        fields = ['name', 'brand']
\ No newline at end of file
+        fields = ['name', 'brand', 'category', 'galary', 'is_cash']
+
+    def filter_discount_active(self, queryset, name, value):
+        if value:
+            return queryset.filter(active_discount_q())
+        return queryset.exclude(active_discount_q())
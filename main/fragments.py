@@ -0,0 +1,47 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import LocalLRUCache, get_versions
+
+local_fragments = LocalLRUCache(
+    maxsize=settings.PRODUCT_FRAGMENTS['LOCAL_SIZE'],
+    timeout=settings.PRODUCT_FRAGMENTS['LOCAL_TIMEOUT'],
+)
+
+
+def fragment_keys(pks, request):
+    # Rasm URL'lari to'liq (build_absolute_uri), shuning uchun host ham kalitga kiradi
+    host = hashlib.md5(request.build_absolute_uri('/').encode()).hexdigest()[:8]
+    versions = get_versions(f'product:{pk}' for pk in pks)
+    return {pk: f'product-card:{pk}:{versions[f"product:{pk}"]}:{host}' for pk in pks}
+
+
+def get_fragments(products, request, render):
+    """
+    Return ``{pk: fragment}`` for ``products``: the local LRU first, then one
+    ``get_many`` on the shared cache, and ``render(misses, request)`` -> ``{pk: dict}``
+    only for what neither had.
+    """
+    keys = fragment_keys(list(dict.fromkeys(product.pk for product in products)), request)
+    if not keys:
+        return {}
+
+    found = local_fragments.get_many(keys.values())
+    wanted = [key for key in keys.values() if key not in found]
+    if wanted:
+        shared = cache.get_many(wanted)
+        for key, fragment in shared.items():
+            local_fragments.set(key, fragment)
+        found.update(shared)
+
+    misses = {product.pk: product for product in products if keys[product.pk] not in found}
+    if misses:
+        rendered = {keys[pk]: fragment for pk, fragment in render(list(misses.values()), request).items()}
+        cache.set_many(rendered, settings.PRODUCT_FRAGMENTS['TIMEOUT'])
+        for key, fragment in rendered.items():
+            local_fragments.set(key, fragment)
+        found.update(rendered)
+
+    return {pk: found[key] for pk, key in keys.items() if key in found}
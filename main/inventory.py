@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import bump_versions
+from .models import CartItem, Product
+
+
+def invalidate_stock(product_id):
+    # Katalog ro'yxatlari va mahsulot sahifasi cache'da stock bilan turadi
+    transaction.on_commit(lambda: bump_versions(['catalog', f'product:{product_id}']))
+
+
+def take_stock(product_id, amount):
+    # Shart bilan UPDATE: qoldiq yetarli bo'lmasa hech bir qator o'zgarmaydi
+    if Product.objects.filter(pk=product_id, stock__gte=amount).update(stock=F('stock') - amount):
+        invalidate_stock(product_id)
+        return True
+    # stock NULL -- qoldiq hisobi yuritilmaydi
+    return Product.objects.filter(pk=product_id, stock__isnull=True).exists()
+
+
+def put_back_stock(product_id, amount):
+    if Product.objects.filter(pk=product_id, stock__isnull=False).update(stock=F('stock') + amount):
+        invalidate_stock(product_id)
+
+
+def reserve_cart_item(cart_item):
+    if not take_stock(cart_item.product_id, cart_item.amount):
+        return False
+
+    reserved_until = timezone.now() + settings.CART_RESERVATION_TIMEOUT
+    CartItem.objects.filter(pk=cart_item.pk).update(reserved_until=reserved_until)
+    cart_item.reserved_until = reserved_until
+    return True
+
+
+def claim_reservation(cart_item):
+    """Clear the cart item's reservation; True only for the caller that held it."""
+    claimed = CartItem.objects.filter(pk=cart_item.pk, reserved_until__isnull=False).update(reserved_until=None)
+    cart_item.reserved_until = None
+    return claimed == 1
+
+
+def release_cart_item(cart_item):
+    if claim_reservation(cart_item):
+        put_back_stock(cart_item.product_id, cart_item.amount)
+
+
+def release_expired_reservations(now=None):
+    now = now or timezone.now()
+    expired = CartItem.objects.filter(reserved_until__lte=now).values_list('pk', 'product_id', 'amount')
+
+    released = 0
+    for pk, product_id, amount in expired.iterator():
+        with transaction.atomic():
+            if CartItem.objects.filter(pk=pk, reserved_until__lte=now).update(reserved_until=None):
+                put_back_stock(product_id, amount)
+                released += 1
+    return released
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+SCHEMA = """
+CREATE TABLE product (id INTEGER PRIMARY KEY, stock INTEGER NOT NULL);
+CREATE TABLE cartitem (id INTEGER PRIMARY KEY, product_id INTEGER NOT NULL, amount INTEGER NOT NULL);
+"""
+
+CONFIGS = {
+    # Django'ning standart SQLite sozlamasi: rollback journal, deferred tranzaksiya, 5s timeout
+    'before': {'init_command': '', 'begin': 'BEGIN', 'timeout': 5},
+    'after': {'init_command': settings.SQLITE_INIT_COMMAND, 'begin': 'BEGIN IMMEDIATE', 'timeout': 20},
+}
+
+
+class Command(BaseCommand):
+    help = "Measure concurrent cart/checkout-style write throughput on SQLite before and after WAL tuning."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=3.0)
+        parser.add_argument('--products', type=int, default=20)
+
+    def handle(self, *args, **options):
+        for name, config in CONFIGS.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                result = self.run(os.path.join(tmp, 'bench.sqlite3'), config, options)
+            self.stdout.write(
+                f"{name:>6}: {result['writes'] / options['seconds']:8.0f} writes/s  "
+                f"{result['reads'] / options['seconds']:8.0f} reads/s  "
+                f"{result['errors']} lock errors"
+            )
+
+    def connect(self, path, config):
+        conn = sqlite3.connect(path, timeout=config['timeout'], isolation_level=None, check_same_thread=False)
+        for command in config['init_command'].split(';'):
+            if command.strip():
+                conn.execute(command)
+        return conn
+
+    def run(self, path, config, options):
+        conn = self.connect(path, config)
+        conn.executescript(SCHEMA)
+        conn.executemany(
+            'INSERT INTO product (id, stock) VALUES (?, ?)',
+            [(i, 10 ** 9) for i in range(1, options['products'] + 1)],
+        )
+        conn.close()
+
+        counts = {'writes': 0, 'reads': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def count(key):
+            with lock:
+                counts[key] += 1
+
+        def writer(seed):
+            conn = self.connect(path, config)
+            product_id = seed % options['products'] + 1
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute(config['begin'])
+                    conn.execute('UPDATE product SET stock = stock - 1 WHERE id = ? AND stock >= 1', (product_id,))
+                    conn.execute('INSERT INTO cartitem (product_id, amount) VALUES (?, 1)', (product_id,))
+                    conn.execute('COMMIT')
+                    count('writes')
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    count('errors')
+            conn.close()
+
+        def reader():
+            conn = self.connect(path, config)
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute('SELECT COUNT(*), SUM(amount) FROM cartitem').fetchone()
+                    count('reads')
+                except sqlite3.OperationalError:
+                    count('errors')
+            conn.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts
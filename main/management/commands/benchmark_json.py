@@ -0,0 +1,73 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from main.renderers import FastJSONRenderer, orjson
+
+
+def product_payload(index):
+    # ProductSerializer chiqishiga o'xshash bitta mahsulot
+    return ReturnDict({
+        'id': index,
+        'name': f'Samsung Galaxy A{index} 128GB',
+        'details': "Ekran 6.5\", 5000 mAh batareya, ikki SIM karta, 50 MP kamera. " * 4,
+        'is_cash': True,
+        'price': 3499000.0 + index,
+        'monthly_price': 291583.33,
+        'country': 'Koreya',
+        'brand': 3,
+        'category': 1,
+        'category_name': _('Smartfonlar'),
+        'images': [
+            {'id': index * 10 + i, 'image': f'http://localhost:8000/media/images/product_{index}_{i}.png',
+             'main': i == 0, 'product': index}
+            for i in range(4)
+        ],
+        'main_image': f'http://localhost:8000/media/images/product_{index}_0.png',
+        'like': False,
+        'like_id': None,
+        'is_cart': False,
+        'versus': False,
+        'discount': 10.0,
+        'discount_price': Decimal('3149100.00'),
+        'discount_date_finished': timezone.localdate(),
+        'properties': [
+            {'id': index * 100 + i, 'title': f'Xususiyat {i}', 'product': index,
+             'value': [{'type': 'Rang', 'value': 'Qora'}, {'type': 'Xotira', 'value': '128 GB'}]}
+            for i in range(5)
+        ],
+        'galary': None,
+        'stock': 25,
+        'effective_price': 3149100.0,
+    }, serializer=None)
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's JSONRenderer with FastJSONRenderer on a paginated product page."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed; FastJSONRenderer falls back to DRF's encoder."))
+
+        page = {
+            'count': 1000, 'total_pages': 10, 'current_page': 1,
+            'next': 'http://localhost:8000/products/?page=2', 'previous': None,
+            'results': ReturnList([product_payload(i) for i in range(options['products'])], serializer=None),
+        }
+
+        for name, renderer in (('drf', JSONRenderer()), ('fast', FastJSONRenderer())):
+            body = renderer.render(page)
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                renderer.render(page)
+            elapsed = (time.perf_counter() - started) / options['repeat']
+            self.stdout.write(f"{name:>5}: {elapsed * 1000:7.3f} ms/page  {len(body):8d} bytes")
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.models import Upload
+from main.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = "Delete chunked upload sessions older than CHUNKED_UPLOADS['EXPIRES'] and their part files."
+
+    def handle(self, *args, **options):
+        expired = Upload.objects.filter(created_at__lt=timezone.now() - settings.CHUNKED_UPLOADS['EXPIRES'])
+        count = 0
+        for upload in expired.iterator():
+            discard_upload(upload)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} expired upload(s)."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from main.recommendations import SOURCES, refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = "Refresh precomputed product recommendations from orders, likes and comparisons."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Recompute every product instead of only those with new events.")
+        parser.add_argument('--kind', choices=sorted(SOURCES), action='append',
+                            help="Only refresh this kind (repeatable).")
+
+    def handle(self, *args, **options):
+        for kind in options['kind'] or sorted(SOURCES):
+            updated = refresh_recommendations(kind, full=options['full'])
+            self.stdout.write(self.style.SUCCESS(f"{kind}: updated {updated} product(s)."))
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import shutil
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.blobs import FILE_FIELDS
+from main.models import Blob
+
+
+def file_digest(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(64 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Move media files that predate content-addressed storage into blobs, "
+        "merging duplicates, and rebuild blob reference counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true',
+                            help="Also delete blob files that no row refers to.")
+        parser.add_argument('--prune-age', type=int, default=3600,
+                            help="Only prune blobs older than this many seconds.")
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, 'adopt'):
+            raise CommandError("The default storage is not ContentAddressedStorage.")
+
+        legacy = set()
+        for model, field in self.file_fields():
+            legacy.update(name for name in self.referenced(model, field) if not default_storage.is_blob(name))
+        blobs = {}
+        for name in sorted(legacy):
+            if not default_storage.exists(name):
+                self.stderr.write(self.style.WARNING(f"Missing file: {name}"))
+                continue
+            blobs[name] = self.move(name)
+        self.stdout.write(f"Moved {len(blobs)} file(s) into {len(set(blobs.values()))} blob(s).")
+
+        names = set(Blob.objects.values_list('name', flat=True))
+        for model, field in self.file_fields():
+            names.update(name for name in self.referenced(model, field) if default_storage.is_blob(name))
+        counted = sum(self.recount(name) > 0 for name in sorted(names))
+        self.stdout.write(f"Counted references for {counted} blob(s).")
+
+        if options['prune']:
+            self.stdout.write(f"Pruned {self.prune(options['prune_age'])} unreferenced blob(s).")
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    @staticmethod
+    def file_fields():
+        return [(model, field) for model, fields in FILE_FIELDS.items() for field in fields]
+
+    @staticmethod
+    def referenced(model, field):
+        return (model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .values_list(field, flat=True).distinct())
+
+    def move(self, name):
+        """
+        Puts a copy of ``name`` into its blob, repoints every row at the blob
+        in one transaction and only then removes the old file, so a crash at
+        any step leaves each row pointing at a file that exists.
+        """
+        path = default_storage.path(name)
+        digest = file_digest(path)
+        temp_path = f'{path}.dedupe'
+        try:
+            os.link(path, temp_path)
+        except OSError:
+            shutil.copyfile(path, temp_path)
+        blob = default_storage.adopt(temp_path, name, digest)
+
+        with transaction.atomic():
+            for model, field in self.file_fields():
+                model.objects.filter(**{field: name}).update(**{field: blob})
+        os.remove(path)
+        return blob
+
+    def recount(self, name):
+        # Blob qatori qulflanadi: parallel incref/decref shu qatorda kutadi va hisob yo'qolmaydi
+        with transaction.atomic():
+            blob, _ = Blob.objects.select_for_update().get_or_create(name=name, defaults={'refs': 0})
+            refs = sum(model.objects.filter(**{field: name}).count() for model, field in self.file_fields())
+            if refs:
+                Blob.objects.filter(name=name).update(refs=refs)
+            else:
+                blob.delete()
+        return refs
+
+    def prune(self, age):
+        root = default_storage.path(default_storage.prefix)
+        # Yangi yuklangan, hali hisoblanmagan blob'larga tegmaslik uchun yoshini tekshiramiz
+        cutoff = time.time() - age
+        pruned = 0
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, default_storage.location).replace(os.sep, '/')
+                if os.path.getmtime(path) > cutoff or Blob.objects.filter(name=name).exists():
+                    continue
+                os.remove(path)
+                pruned += 1
+        return pruned
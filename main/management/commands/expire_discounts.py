@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.utils import timezone
+
+from main.cache import bump_version, bump_versions
+from main.models import Product, effective_price_expression
+
+
+class Command(BaseCommand):
+    help = "Reset expired product discounts and refresh the indexed effective price."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recompute', action='store_true',
+            help="Also recompute effective_price for every product in one UPDATE.",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        expired_products = Product.objects.filter(discount_date_finished__lt=today)
+        # pk'lar faqat versiyalarni oshirish uchun; UPDATE filtr bilan ketadi, katta pk__in ro'yxatsiz
+        expired_ids = list(expired_products.values_list('pk', flat=True))
+        expired = expired_products.update(
+            discount=None,
+            discount_price=None,
+            discount_date_finished=None,
+            effective_price=F('price'),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} discount(s)."))
+
+        if options['recompute']:
+            updated = Product.objects.update(effective_price=effective_price_expression(today))
+            self.stdout.write(self.style.SUCCESS(f"Recomputed effective price for {updated} product(s)."))
+            expired_ids = Product.objects.values_list('pk', flat=True)
+
+        if expired or options['recompute']:
+            bump_version('catalog')
+            # Mahsulot sahifasi va kartochka fragmentlari ham eskiradi
+            bump_versions(f'product:{pk}' for pk in expired_ids)
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.schema import build_schema
+
+
+class Command(BaseCommand):
+    help = "Write the OpenAPI schema served at /openapi.json (run once per deploy)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=str(settings.OPENAPI_SCHEMA_FILE),
+            help="Where to write the schema (default: settings.OPENAPI_SCHEMA_FILE).",
+        )
+
+    def handle(self, *args, **options):
+        content = build_schema()
+        with open(options['output'], 'wb') as f:
+            f.write(content)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(content)} bytes to {options['output']}."))
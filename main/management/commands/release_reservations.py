@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Release expired cart reservations and return their stock."
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} cart reservation(s)."))
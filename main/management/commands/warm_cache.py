@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import resolve
+
+from main.cache import is_shared_cache
+from main.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-render the hottest anonymous catalog responses into the shared cache: navigation, "
+        "category and brand lists, the first /products/ page per category and the top product pages."
+    )
+
+    def add_arguments(self, parser):
+        options = settings.CACHE_WARMUP
+        parser.add_argument('--workers', type=int, default=options['WORKERS'])
+        parser.add_argument('--time-budget', type=float, default=options['TIME_BUDGET'],
+                            help="Seconds; URLs not started by then are skipped.")
+        parser.add_argument('--top-products', type=int, default=options['TOP_PRODUCTS'])
+        parser.add_argument('--host', default=options['HOST'],
+                            help="Public host the cached bodies are built for (CACHE_WARMUP_HOST).")
+        parser.add_argument('--local', action='store_true',
+                            help="Allow a process-local cache backend; only this process gets warmed.")
+
+    def get_urls(self, top_products):
+        # Eng issiqlari birinchi: navigatsiya, ro'yxatlar, keyin mashhurlik bo'yicha mahsulot sahifalari
+        urls = ['/navigation/', '/categories/', '/brands/', '/products/']
+        urls += [f'/products/?category={pk}' for pk in Category.objects.order_by('pk').values_list('pk', flat=True)]
+        top = Product.objects.order_by('-views', '-orders', 'pk').values_list('pk', flat=True)[:top_products]
+        for pk in top:
+            urls += [f'/products/{pk}/page/', f'/products/{pk}/recommendations/']
+        return urls
+
+    def warm(self, factory, url, deadline):
+        if time.monotonic() >= deadline:
+            return None
+        try:
+            request = factory.get(url, HTTP_ACCEPT='application/json')
+            request.cache_warmup = True
+            match = resolve(request.path_info)
+            return match.func(request, *match.args, **match.kwargs).status_code
+        except Exception as e:
+            self.stderr.write(f"{url}: {e!r}")
+            return 500
+        finally:
+            # Har bir worker thread o'z ulanishini ochadi
+            connections.close_all()
+
+    def handle(self, *args, **options):
+        if not options['host']:
+            raise CommandError(
+                "Set CACHE_WARMUP_HOST (or --host) to the public host: cached responses embed absolute media URLs."
+            )
+        if not is_shared_cache() and not options['local']:
+            raise CommandError(
+                f"The default cache ({settings.CACHES['default']['BACKEND']}) is per-process; warming it from "
+                "this command would not reach the web workers. Configure REDIS_URL or pass --local."
+            )
+
+        started = time.monotonic()
+        deadline = started + options['time_budget']
+        factory = RequestFactory(
+            HTTP_HOST=options['host'],
+            **({'wsgi.url_scheme': 'https'} if settings.CACHE_WARMUP['SECURE'] else {}),
+        )
+        urls = self.get_urls(options['top_products'])
+
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            statuses = list(pool.map(lambda url: self.warm(factory, url, deadline), urls))
+
+        failed = 0
+        for url, status in zip(urls, statuses):
+            if status not in (None, 200):
+                failed += 1
+                self.stderr.write(f"{url}: HTTP {status}")
+        skipped = statuses.count(None)
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {len(urls) - skipped - failed} of {len(urls)} URL(s) in {time.monotonic() - started:.1f}s "
+            f"({failed} failed, {skipped} skipped over the time budget)."
+        ))
@@ -0,0 +1,158 @@
+import asyncio
+import gzip
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(request):
+    encodings = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+def compress(content, encoding, quality=None):
+    if encoding == 'br':
+        return brotli.compress(content, quality=quality or settings.COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=quality or settings.COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def is_compressible(content_type, size):
+    return (
+        size >= settings.COMPRESS_MIN_SIZE
+        and content_type.split(';')[0].strip() in settings.COMPRESS_CONTENT_TYPES
+    )
+
+
+def precompress(content, content_type, best=False):
+    """
+    Compressed variants of a body, stored next to it in a cache entry.
+    ``best`` is for artifacts built once per process or offline; cache
+    misses on the request path use the configured levels.
+    """
+    if not is_compressible(content_type, len(content)):
+        return {}
+    return {encoding: compress(content, encoding, quality=(11 if encoding == 'br' else 9) if best else None)
+            for encoding in available_encodings()}
+
+
+class CompressionMiddleware:
+    """
+    gzip/brotli for allowlisted content types above COMPRESS_MIN_SIZE.
+    Responses may carry a ``precompressed`` dict of ready-made bodies
+    (see ``CatalogCacheMixin``), which is used instead of compressing again.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not is_compressible(response.get('Content-Type', ''), len(response.content)):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accepted = accepted_encodings(request)
+        encoding = next((name for name in available_encodings() if name in accepted), None)
+        if encoding is None:
+            return response
+
+        precompressed = getattr(response, 'precompressed', None) or {}
+        compressed = precompressed.get(encoding) or compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Sheds load once ``CONCURRENCY_LIMIT['MAX_IN_FLIGHT']`` requests are
+    running in this process: a request that cannot get a slot within
+    ``QUEUE_TIMEOUT`` seconds gets 503 with Retry-After instead of queueing
+    behind work that is already slow.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        options = settings.CONCURRENCY_LIMIT
+        self.slots = threading.BoundedSemaphore(options['MAX_IN_FLIGHT'])
+        self.timeout = options['QUEUE_TIMEOUT']
+        self.retry_after = options['RETRY_AFTER']
+        self.exempt_paths = tuple(options['EXEMPT_PATHS'])
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path.startswith(self.exempt_paths):
+            return self.get_response(request)
+        if not self.slots.acquire(timeout=self.timeout):
+            return self.overloaded()
+        try:
+            return self.get_response(request)
+        finally:
+            self.slots.release()
+
+    async def __acall__(self, request):
+        if request.path.startswith(self.exempt_paths):
+            return await self.get_response(request)
+        # Event loop'ni bloklamaslik uchun kutish thread'da
+        if not self.slots.acquire(blocking=False) and not await asyncio.to_thread(self.slots.acquire, timeout=self.timeout):
+            return self.overloaded()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.slots.release()
+
+    def overloaded(self):
+        response = JsonResponse({'detail': "Server band, birozdan so'ng qayta urinib ko'ring."}, status=503)
+        response['Retry-After'] = str(self.retry_after)
+        return response
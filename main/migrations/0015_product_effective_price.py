@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+
+def fill_effective_price(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    Product.objects.update(effective_price=Case(
+        When(
+            Q(discount_price__isnull=False)
+            & (Q(discount_date_finished__isnull=True) | Q(discount_date_finished__gte=timezone.localdate())),
+            then=F('discount_price'),
+        ),
+        default=F('price'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_product_stock_cartitem_reserved_until'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+    ]
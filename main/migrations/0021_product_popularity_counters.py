@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:46
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    sources = {
+        'likes': apps.get_model('main', 'LikedItem'),
+        'cart_adds': apps.get_model('main', 'CartItem'),
+        'orders': apps.get_model('main', 'OrderItem'),
+    }
+    for field, model in sources.items():
+        counts = model.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(count=Count('pk'))
+        Product.objects.update(**{field: Coalesce(Subquery(counts.values('count'), output_field=IntegerField()), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='cart_adds',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='likes',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='orders',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='views',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
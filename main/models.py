@@ -1,6 +1,9 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.db.models import Model
+from django.db.models import Case, F, Model, Q, When
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -50,13 +53,62 @@ class Product(models.Model):
     discount = models.FloatField(blank=True, null=True)
     discount_price = models.FloatField(blank=True, null=True)
     discount_date_finished = models.DateField(blank=True, null=True)
+    # NULL -- qoldiq hisobi yuritilmaydi, checkout stock bo'yicha tekshirilmaydi
+    stock = models.PositiveIntegerField(null=True, blank=True)
+    effective_price = models.FloatField(db_index=True, editable=False)
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     galary = models.ForeignKey(Galary, on_delete=models.SET_NULL, null=True, blank=True)
+    # Mashhurlik hisoblagichlari faqat main.counters orqali F() bilan yoziladi
+    likes = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    cart_adds = models.PositiveIntegerField(default=0, editable=False)
+    orders = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    views = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'effective_price']),
+            models.Index(fields=['brand', 'effective_price']),
+        ]
+
+    COUNTER_FIELDS = ('likes', 'cart_adds', 'orders', 'views')
 
     def __str__(self):
         return self.name
 
+    def get_effective_price(self, today=None):
+        today = today or timezone.localdate()
+        if self.discount_price is not None and (
+            self.discount_date_finished is None or self.discount_date_finished >= today
+        ):
+            return self.discount_price
+        return self.price
+
+    def save(self, *args, **kwargs):
+        self.effective_price = self.get_effective_price()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'effective_price'}
+        elif not self._state.adding and not kwargs.get('force_insert'):
+            # Eski nusxadagi hisoblagichlar flush qilingan qiymatlarni bosib ketmasin
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+def active_discount_q(today=None):
+    today = today or timezone.localdate()
+    return Q(discount_price__isnull=False) & (
+        Q(discount_date_finished__isnull=True) | Q(discount_date_finished__gte=today)
+    )
+
+
+def effective_price_expression(today=None):
+    """SQL counterpart of ``Product.get_effective_price`` for queryset updates."""
+    return Case(When(active_discount_q(today), then=F('discount_price')), default=F('price'))
+
 class Image(models.Model):
     image = models.ImageField(upload_to='images/', null=True, blank=True)
     main = models.BooleanField(default=False)
@@ -87,6 +139,7 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     amount = models.PositiveIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
+    reserved_until = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.user.username
@@ -148,6 +201,71 @@ class Message(models.Model):
     file = models.FileField(upload_to='files/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id']),
+        ]
+
     def __str__(self):
         return self.user.username
 
+
+
+class Upload(models.Model):
+    """Chunked upload session; the bytes live in ``<CHUNKED_UPLOADS TEMP_DIR>/<id>.part``."""
+    TARGET_CHOICES = (
+        ('image', 'Image'),
+        ('message', 'Message'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    target = models.CharField(choices=TARGET_CHOICES, max_length=20)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # Bo'lak yozilayotgan bo'lsa, shu vaqtgacha boshqa so'rov uni ololmaydi
+    writing_until = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.filename
+
+
+class Blob(models.Model):
+    """Content-addressed media file and the number of file fields pointing at it."""
+    name = models.CharField(max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class ProductNeighbor(models.Model):
+    """Top-K precomputed recommendations per product (``compute_recommendations``)."""
+    KIND_CHOICES = (
+        ('similar', 'Similar'),
+        ('bought_together', 'Bought together'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(choices=KIND_CHOICES, max_length=20)
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'kind', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.neighbor_id}"
+
+
+class RecommendationCursor(models.Model):
+    """Last event id per source table already folded into ``ProductNeighbor``."""
+    source = models.CharField(max_length=50, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.source}: {self.last_id}"
@@ -1,4 +1,7 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 import math
 
@@ -20,3 +23,31 @@ class CustomPageNumberPagination(PageNumberPagination):
             'previous': self.get_previous_link(),
             'results': data
         })
+
+
+class MessageCursorPagination(CursorPagination):
+    # Yangi xabarlar qo'shilganda sahifalar siljimaydi, COUNT(*) ham yo'q
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin paginator that uses the planner's row estimate instead of
+    ``COUNT(*)`` for unfiltered lists on PostgreSQL once a table is large.
+    Filtered lists and other databases keep the exact count.
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where and connections[self.object_list.db].vendor == 'postgresql':
+            with connections[self.object_list.db].cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [self.object_list.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return int(row[0])
+        return super().count
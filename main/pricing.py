@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .cache import bump_version, bump_versions
+from .models import Product, active_discount_q
+
+
+def update_prices(queryset, **values):
+    """
+    One UPDATE for the whole ``queryset``, then a single catalog version bump
+    plus the per-product versions the page and card fragment caches use.
+    """
+    product_ids = list(queryset.values_list('pk', flat=True))
+    # Admin'dagi qidiruv/filtrlar distinct() qo'shishi mumkin, UPDATE esa pk bo'yicha subquery bilan
+    updated = Product.objects.filter(pk__in=queryset.values('pk')).update(**values)
+    if updated:
+        def invalidate():
+            bump_version('catalog')
+            bump_versions(f'product:{pk}' for pk in product_ids)
+        transaction.on_commit(invalidate)
+    return updated
+
+
+def set_discount(queryset, percent, until=None):
+    """``percent`` off the list price until ``until`` (inclusive, ``None`` = open-ended)."""
+    discount_price = Round(F('price') * (100 - percent) / 100, 2)
+    active = until is None or until >= timezone.localdate()
+    return update_prices(
+        queryset,
+        discount=percent,
+        discount_price=discount_price,
+        discount_date_finished=until,
+        effective_price=discount_price if active else F('price'),
+    )
+
+
+def clear_discount(queryset):
+    return update_prices(
+        queryset, discount=None, discount_price=None, discount_date_finished=None, effective_price=F('price'),
+    )
+
+
+def adjust_prices(queryset, percent):
+    """Raise (or with a negative ``percent`` lower) list, monthly and discount prices together."""
+    factor = (100 + percent) / 100
+    price = Round(F('price') * factor, 2)
+    discount_price = Round(F('discount_price') * factor, 2)
+    return update_prices(
+        queryset,
+        price=price,
+        monthly_price=Round(F('monthly_price') * factor, 2),
+        discount_price=discount_price,
+        # SET ichida F() eski qiymatlarni o'qiydi, shuning uchun yangi narxlar qayta yoziladi
+        effective_price=Case(When(active_discount_q(), then=discount_price), default=price),
+    )
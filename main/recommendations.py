@@ -0,0 +1,120 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .cache import bump_version
+from .models import LikedItem, OrderItem, ProductNeighbor, RecommendationCursor, VersusItem
+
+# Har bir tur uchun "savat"lar: bir savatda birga uchragan mahsulotlar o'xshash hisoblanadi
+SOURCES = {
+    'bought_together': ((OrderItem, 'order_id'),),
+    'similar': ((LikedItem, 'user_id'), (VersusItem, 'user_id')),
+}
+
+
+def load_baskets(kind, products=None):
+    """
+    ``{(source, basket): {product ids}}`` for every basket, or only for the
+    baskets that contain one of ``products``.
+    """
+    baskets = defaultdict(set)
+    for index, (model, basket_field) in enumerate(SOURCES[kind]):
+        rows = model.objects.all()
+        if products is not None:
+            rows = rows.filter(**{f'{basket_field}__in': model.objects.filter(product_id__in=products).values(basket_field)})
+        for basket, product in rows.values_list(basket_field, 'product_id').iterator(chunk_size=5000):
+            baskets[index, basket].add(product)
+    return baskets
+
+
+def basket_counts(kind, products):
+    counts = Counter()
+    for model, basket_field in SOURCES[kind]:
+        rows = (model.objects.filter(product_id__in=products).values('product_id')
+                .annotate(count=Count(basket_field, distinct=True)))
+        for row in rows:
+            counts[row['product_id']] += row['count']
+    return counts
+
+
+def co_occurrences(baskets, products=None):
+    """Pair counts from all baskets in one pass; only pairs starting in ``products`` when given."""
+    pairs = Counter()
+    max_size = settings.RECOMMENDATIONS['MAX_BASKET_SIZE']
+    for items in baskets.values():
+        # Juda katta savatlar (bot, ulgurji xarid) har bir juftlikni bir xil kuchaytirib yuboradi
+        if len(items) < 2 or len(items) > max_size:
+            continue
+        for a, b in combinations(sorted(items), 2):
+            if products is None or a in products:
+                pairs[a, b] += 1
+            if products is None or b in products:
+                pairs[b, a] += 1
+    return pairs
+
+
+def top_neighbors(kind, products=None):
+    """Cosine-scored top-K neighbours per product, as unsaved ``ProductNeighbor`` rows."""
+    baskets = load_baskets(kind, products)
+    pairs = co_occurrences(baskets, products)
+    involved = {product for pair in pairs for product in pair}
+    counts = basket_counts(kind, involved)
+
+    scored = defaultdict(list)
+    for (product, neighbor), together in pairs.items():
+        scored[product].append((together / math.sqrt(counts[product] * counts[neighbor]), neighbor))
+
+    top_k = settings.RECOMMENDATIONS['TOP_K']
+    return [
+        ProductNeighbor(product_id=product, neighbor_id=neighbor, kind=kind, score=score)
+        for product, candidates in scored.items()
+        for score, neighbor in heapq.nlargest(top_k, candidates)
+    ]
+
+
+def changed_products(kind):
+    """Products sharing a basket with an event newer than the stored cursor, and the new cursor values."""
+    products = set()
+    cursors = {}
+    for model, basket_field in SOURCES[kind]:
+        source = model._meta.model_name
+        last_id = RecommendationCursor.objects.filter(source=source).values_list('last_id', flat=True).first() or 0
+        cursors[source] = model.objects.aggregate(last=Max('id'))['last'] or last_id
+        new_baskets = model.objects.filter(id__gt=last_id, id__lte=cursors[source]).values(basket_field)
+        products.update(model.objects.filter(**{f'{basket_field}__in': new_baskets}).values_list('product_id', flat=True))
+    return products, cursors
+
+
+def refresh_recommendations(kind, full=False):
+    """
+    Recomputes ``kind`` neighbours for every product (``full``) or only for
+    products whose baskets gained events since the last run, plus the products
+    listing one of them as a neighbour (the cosine score depends on both
+    products' basket counts). Removed likes and order lines are only noticed
+    by a full run. Returns the products updated.
+    """
+    products, cursors = changed_products(kind)
+    if full:
+        products = None
+    elif not products:
+        return 0
+    else:
+        products.update(ProductNeighbor.objects.filter(kind=kind, neighbor_id__in=products)
+                        .values_list('product_id', flat=True))
+
+    rows = top_neighbors(kind, products)
+    with transaction.atomic():
+        stale = ProductNeighbor.objects.filter(kind=kind)
+        if products is not None:
+            stale = stale.filter(product_id__in=products)
+        stale.delete()
+        ProductNeighbor.objects.bulk_create(rows, batch_size=1000)
+        for source, last_id in cursors.items():
+            RecommendationCursor.objects.update_or_create(source=source, defaults={'last_id': last_id})
+    bump_version('recommendations')
+    return len({row.product_id for row in rows}) if products is None else len(products)
@@ -1,6 +1,17 @@
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery, prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.response import Response
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+from .counters import popularity
+from .fragments import get_fragments
+from .pricing import adjust_prices, clear_discount, set_discount
+from .inventory import claim_reservation, release_cart_item, reserve_cart_item, take_stock
 from .permissions import *
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -20,6 +31,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
+class TokenObtainPairWithClaimsSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['isadmin'] = user.isadmin
+        return token
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -34,19 +53,68 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class BrandSerializer(serializers.ModelSerializer):
+def parse_csv(value):
+    return {item.strip() for item in value.split(',') if item.strip()} if value else set()
+
+
+class SparseFieldsMixin:
+    """
+    ``?fields=id,name`` limits the view's serializer to those fields and
+    ``?expand=brand`` swaps an id for the nested object listed in
+    ``Meta.expandable_fields``. Dropped fields are never bound, so their
+    method fields do not run. Serializers built without a view in the
+    context (nested helpers) are left alone.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or 'view' not in self.context or self.root not in (self, self.parent):
+            return fields
+
+        wanted = parse_csv(request.query_params.get('fields'))
+        expand = parse_csv(request.query_params.get('expand'))
+        if wanted:
+            fields = {name: field for name, field in fields.items() if name in wanted | expand}
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in expand & expandable.keys():
+            fields[name] = expandable[name](read_only=True)
+        return fields
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'image', 'icon',]
+
+
+class NavigationBrandSerializer(serializers.ModelSerializer):
+    product_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Brand
-        fields = '__all__'
+        fields = ['id', 'name', 'image', 'product_count']
+
+
+class NavigationCategorySerializer(serializers.ModelSerializer):
+    product_count = serializers.IntegerField(read_only=True)
+    brands = NavigationBrandSerializer(source='brand_set', many=True, read_only=True)
 
-class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name', 'image', 'icon',]
+        fields = ['id', 'name', 'image', 'icon', 'product_count', 'brands']
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class BrandSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = Brand
+        fields = '__all__'
+        expandable_fields = {'category': CategorySerializer}
+
+
+class ImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Image
         fields = '__all__'
@@ -75,7 +143,7 @@ class PropertySerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class PropertyTypeSerializer(serializers.ModelSerializer):
+class PropertyTypeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     value = serializers.SerializerMethodField()
 
     class Meta:
@@ -83,7 +151,7 @@ class PropertyTypeSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'value', 'product']
 
     def get_value(self, obj):
-        properties = Property.objects.filter(property_type=obj)
+        properties = obj.property_set.all()
 
         return [{'type': prop.title, 'value': prop.value} for prop in properties]
 
@@ -95,7 +163,70 @@ class PropertyTypeSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+def render_product_fragments(products, request):
+    prefetch_related_objects(products, 'category', 'image_set', 'propertytype_set__property_set')
+    data = ProductFragmentSerializer(products, many=True, context={'request': request}).data
+    return {product.pk: dict(row) for product, row in zip(products, data)}
+
+
+class CardFragmentMixin:
+    """
+    Under a ``CardFragmentListSerializer`` the fields in ``fragment_fields`` are
+    skipped while rows render and are filled in afterwards from the cached,
+    user-independent product cards of the whole page (``main.fragments``).
+    Nested serializers (``?expand=``) are always rendered per request.
+    """
+    fragment_fields = ()
+
+    @property
+    def deferring(self):
+        return getattr(self.root, 'deferred', None) is not None
+
+    @property
+    def _readable_fields(self):
+        deferring = self.deferring
+        for field in super()._readable_fields:
+            if deferring and field.field_name in self.fragment_fields and not isinstance(field, serializers.BaseSerializer):
+                continue
+            yield field
+
+    def to_representation(self, instance):
+        ret = super().to_representation(instance)
+        if self.deferring and self.parent is self.root:
+            self.root.deferred.append(instance)
+        return ret
+
+    def card_product(self, instance):
+        return instance.product
+
+    def fragment_values(self, fragment):
+        return fragment
+
+    def fill_fragment(self, row, fragment):
+        # Kalitlar tartibi Meta.fields bo'yicha qoladi
+        values = {**self.fragment_values(fragment), **row}
+        return {name: values[name] for name, field in self.fields.items() if not field.write_only}
+
+
+class CardFragmentListSerializer(serializers.ListSerializer):
+    deferred = None
+
+    def to_representation(self, data):
+        request = self.context.get('request')
+        if request is None or not isinstance(self.child, CardFragmentMixin):
+            return super().to_representation(data)
+
+        self.deferred = []
+        try:
+            rows = super().to_representation(data)
+        finally:
+            instances, self.deferred = self.deferred, None
+        products = [self.child.card_product(instance) for instance in instances]
+        fragments = get_fragments(products, request, render_product_fragments)
+        return [self.child.fill_fragment(row, fragments[product.pk]) for row, product in zip(rows, products)]
+
+
+class ProductSerializer(CardFragmentMixin, SparseFieldsMixin, serializers.ModelSerializer):
     images = serializers.SerializerMethodField()
     main_image = serializers.SerializerMethodField()
     like = serializers.SerializerMethodField()
@@ -105,21 +236,63 @@ class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.SerializerMethodField()
     versus = serializers.SerializerMethodField()
 
+    # Foydalanuvchiga bog'liq bo'lmagan kartochka qismi; ro'yxatlarda cache'dan olinadi
+    fragment_fields = (
+        'id', 'name', 'details', 'is_cash', 'price', 'monthly_price', 'country', 'brand', 'category',
+        'category_name', 'images', 'main_image', 'discount', 'discount_price', 'discount_date_finished',
+        'properties', 'effective_price',
+    )
+
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'details', 'is_cash', 'price', 'monthly_price',
             'country', 'brand', 'category', 'category_name' ,'images', 'main_image',
-            'like', 'like_id','is_cart','versus', 'discount','discount_price','discount_date_finished' ,'properties' , 'galary'
+            'like', 'like_id','is_cart','versus', 'discount','discount_price','discount_date_finished' ,'properties' , 'galary',
+            'stock', 'effective_price',
 
         ]
+        expandable_fields = {'brand': BrandSerializer, 'category': CategorySerializer}
+        list_serializer_class = CardFragmentListSerializer
+
+    @staticmethod
+    def setup_queryset(queryset, fields, user, cached=False):
+        """
+        Add only the joins, prefetches and per-user flags the rendered ``fields`` need.
+        With ``cached=True`` (list views) images and properties are left to
+        ``CardFragmentListSerializer``, which prefetches them for cache misses only.
+        """
+        field_names = set(fields)
+        if cached:
+            field_names -= {'images', 'main_image', 'properties'}
+        if 'category_name' in field_names or isinstance(fields.get('category'), CategorySerializer):
+            queryset = queryset.select_related('category')
+        if isinstance(fields.get('brand'), BrandSerializer):
+            queryset = queryset.select_related('brand')
+        if field_names & {'images', 'main_image'}:
+            queryset = queryset.prefetch_related('image_set')
+        if 'properties' in field_names:
+            queryset = queryset.prefetch_related('propertytype_set__property_set')
+
+        if user.is_authenticated:
+            if field_names & {'like', 'like_id'}:
+                liked = LikedItem.objects.filter(user_id=user.id, product=OuterRef('pk'))
+                queryset = queryset.annotate(liked_id=Subquery(liked.values('id')[:1]))
+            if 'is_cart' in field_names:
+                queryset = queryset.annotate(in_cart=Exists(CartItem.objects.filter(user_id=user.id, product=OuterRef('pk'))))
+            if 'versus' in field_names:
+                queryset = queryset.annotate(in_versus=Exists(VersusItem.objects.filter(user_id=user.id, product=OuterRef('pk'))))
+        return queryset
+
+    def card_product(self, instance):
+        return instance
 
     def get_images(self, obj):
         images = obj.image_set.all()
-        return ImageSerializer(images, many=True, context=self.context).data
+        return ImageSerializer(images, many=True, context={'request': self.context['request']}).data
 
     def get_main_image(self, obj):
-        main_img = obj.image_set.filter(main=True).first()
+        main_img = next((image for image in obj.image_set.all() if image.main), None)
         if main_img:
             return self.context['request'].build_absolute_uri(main_img.image.url)
         return None
@@ -127,19 +300,25 @@ class ProductSerializer(serializers.ModelSerializer):
     def get_like(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
-            return LikedItem.objects.filter(user=user, product=obj).exists()
+            if hasattr(obj, 'liked_id'):
+                return obj.liked_id is not None
+            return LikedItem.objects.filter(user_id=user.id, product=obj).exists()
         return False
 
     def get_versus(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
-            return VersusItem.objects.filter(user=user, product=obj).exists()
+            if hasattr(obj, 'in_versus'):
+                return obj.in_versus
+            return VersusItem.objects.filter(user_id=user.id, product=obj).exists()
         return False
 
     def get_like_id(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
-            return LikedItem.objects.filter(user=user, product=obj).values_list('id', flat=True).first()
+            if hasattr(obj, 'liked_id'):
+                return obj.liked_id
+            return LikedItem.objects.filter(user_id=user.id, product=obj).values_list('id', flat=True).first()
         return False
 
     def get_category_name(self, obj):
@@ -150,23 +329,57 @@ class ProductSerializer(serializers.ModelSerializer):
     def get_is_cart(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
-            return CartItem.objects.filter(user=user, product=obj).exists()
+            if hasattr(obj, 'in_cart'):
+                return obj.in_cart
+            return CartItem.objects.filter(user_id=user.id, product=obj).exists()
         return False
 
     def get_properties(self, obj):
-        property_types = PropertyType.objects.filter(product=obj)
+        property_types = obj.propertytype_set.all()
         return PropertyTypeSerializer(property_types, many=True).data
 
-class CartItemSerializer(serializers.ModelSerializer):
+class ProductFragmentSerializer(ProductSerializer):
+    """User-independent part of a product card, cached by ``main.fragments``."""
+    class Meta(ProductSerializer.Meta):
+        fields = list(ProductSerializer.fragment_fields)
+        list_serializer_class = serializers.ListSerializer
+
+
+class CartItemSerializer(CardFragmentMixin, serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
     product_price = serializers.ReadOnlyField(source='product.price')
     product_image = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
+    reserve = serializers.BooleanField(write_only=True, required=False)
+
+    fragment_fields = ('product_image',)
 
     class Meta:
         model = CartItem
-        fields = ['id', 'user', 'product', 'product_image', 'product_name', 'product_price', 'amount', 'total_price', 'created_at']
-        read_only_fields = ['user', 'created_at']
+        fields = ['id', 'user', 'product', 'product_image', 'product_name', 'product_price', 'amount', 'total_price', 'created_at',
+                  'reserve', 'reserved_until']
+        read_only_fields = ['user', 'created_at', 'reserved_until']
+        list_serializer_class = CardFragmentListSerializer
+
+    def create(self, validated_data):
+        reserve = validated_data.pop('reserve', False)
+        with transaction.atomic():
+            cart_item = super().create(validated_data)
+            if reserve and not reserve_cart_item(cart_item):
+                raise serializers.ValidationError({'amount': "Omborda yetarli mahsulot yo'q."})
+        return cart_item
+
+    def update(self, instance, validated_data):
+        reserve = validated_data.pop('reserve', instance.reserved_until is not None)
+        with transaction.atomic():
+            release_cart_item(instance)
+            instance = super().update(instance, validated_data)
+            if reserve and not reserve_cart_item(instance):
+                raise serializers.ValidationError({'amount': "Omborda yetarli mahsulot yo'q."})
+        return instance
+
+    def fragment_values(self, fragment):
+        return {'product_image': fragment['main_image']}
 
     def get_product_image(self, obj):
         main_image = obj.product.image_set.filter(main=True).first()
@@ -220,39 +433,45 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         cart_item_ids = validated_data.get('cart_item_ids')
 
-        cart_items = CartItem.objects.filter(id__in=cart_item_ids, user=user)
-
-
-        if not cart_items.exists():
-            raise serializers.ValidationError("Tanlangan CartItemlar topilmadi.")
-
-        order = Order.objects.create(
-            user=user,
-            first_name=validated_data['first_name'],
-            last_name=validated_data['last_name'],
-            phone_number=validated_data['phone_number'],
-            address=validated_data['address'],
-            payment_type=validated_data['payment_type'],
-            total_price=0,
-        )
-
-        total = 0
-
-        # Tanlangan CartItemlarni OrderItemga qo‘shish
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                amount=item.amount
+        with transaction.atomic():
+            cart_items = list(CartItem.objects.filter(id__in=cart_item_ids, user=user).select_related('product'))
+
+            if not cart_items:
+                raise serializers.ValidationError("Tanlangan CartItemlar topilmadi.")
+
+            # Band qilingan (reserved) itemlar uchun qoldiq allaqachon ayirilgan
+            needed = defaultdict(int)
+            for item in cart_items:
+                if not claim_reservation(item):
+                    needed[item.product_id] += item.amount
+
+            # Qoldiqni mahsulot id tartibida ayirish, har bir mahsulot uchun bitta shartli UPDATE
+            short = [product_id for product_id in sorted(needed) if not take_stock(product_id, needed[product_id])]
+            if short:
+                raise serializers.ValidationError({
+                    'cart_item_ids': "Omborda yetarli mahsulot yo'q.",
+                    'products': short,
+                })
+
+            order = Order.objects.create(
+                user=user,
+                first_name=validated_data['first_name'],
+                last_name=validated_data['last_name'],
+                phone_number=validated_data['phone_number'],
+                address=validated_data['address'],
+                payment_type=validated_data['payment_type'],
+                total_price=sum(item.amount * item.product.price for item in cart_items),
             )
-            total += item.amount * item.product.price  # Total narxini hisoblash
 
-        # Orderning umumiy narxini yangilash
-        order.total_price = total
-        order.save()
+            # Tanlangan CartItemlarni OrderItemga qo‘shish
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=item.product, amount=item.amount) for item in cart_items
+            ])
+            for item in cart_items:
+                popularity.add_on_commit(item.product_id, 'orders')
 
-        # Savatdagi tanlangan CartItemlarni o'chirish
-        cart_items.delete()
+            # Savatdagi tanlangan CartItemlarni o'chirish
+            CartItem.objects.filter(id__in=[item.id for item in cart_items]).delete()
 
         return order
 
@@ -273,32 +492,162 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = '__all__'
 
+class BulkPriceSerializer(serializers.Serializer):
+    """
+    Admin-only bulk repricing: ``discount`` (percent + optional end date),
+    ``clear_discount`` or ``adjust_price`` (percent, may be negative) for the
+    given ``ids`` and/or every product of a ``brand`` / ``category``.
+    """
+    OPERATIONS = ('discount', 'clear_discount', 'adjust_price')
+
+    operation = serializers.ChoiceField(choices=OPERATIONS)
+    percent = serializers.FloatField(required=False)
+    until = serializers.DateField(required=False, allow_null=True)
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    brand = serializers.PrimaryKeyRelatedField(queryset=Brand.objects.all(), required=False)
+    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False)
+
+    def validate(self, attrs):
+        if not attrs.keys() & {'ids', 'brand', 'category'}:
+            raise serializers.ValidationError("ids, brand yoki category ko'rsatilishi kerak.")
+        operation, percent = attrs['operation'], attrs.get('percent')
+        if operation == 'discount' and (percent is None or not 0 < percent < 100):
+            raise serializers.ValidationError({'percent': "Chegirma 0 va 100 orasida bo'lishi kerak."})
+        if operation == 'adjust_price' and (percent is None or percent <= -100):
+            raise serializers.ValidationError({'percent': "Foiz -100 dan katta bo'lishi kerak."})
+        return attrs
+
+    def get_queryset(self):
+        queryset = Product.objects.all()
+        if 'ids' in self.validated_data:
+            queryset = queryset.filter(pk__in=self.validated_data['ids'])
+        if 'brand' in self.validated_data:
+            queryset = queryset.filter(brand=self.validated_data['brand'])
+        if 'category' in self.validated_data:
+            queryset = queryset.filter(category=self.validated_data['category'])
+        return queryset
+
+    def apply(self):
+        data = self.validated_data
+        if data['operation'] == 'discount':
+            return set_discount(self.get_queryset(), data['percent'], data.get('until'))
+        if data['operation'] == 'clear_discount':
+            return clear_discount(self.get_queryset())
+        return adjust_prices(self.get_queryset(), data['percent'])
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Upload
+        fields = ['id', 'target', 'filename', 'size', 'offset', 'created_at']
+        read_only_fields = ['offset']
+
+    def validate_size(self, value):
+        if value > settings.CHUNKED_UPLOADS['MAX_SIZE']:
+            raise serializers.ValidationError("Fayl hajmi juda katta.")
+        return value
+
+    def validate_target(self, value):
+        if value == 'image' and not IsAdmin().has_permission(self.context['request'], None):
+            raise serializers.ValidationError("Rasm yuklash faqat admin uchun.")
+        return value
+
+    def validate_filename(self, value):
+        return os.path.basename(value)
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Image
         fields = '__all__'
 
-class GalarySerializer(serializers.ModelSerializer):
+class GalarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Galary
         fields = '__all__'
 
-class LikedItemListSerializer(serializers.ModelSerializer):
-    product = ProductSerializer()
+
+class ProductCardSerializer(ProductSerializer):
+    class Meta(ProductSerializer.Meta):
+        fields = ['id', 'name', 'price', 'discount_price', 'effective_price', 'main_image']
+
+
+class ProductNeighborSerializer(serializers.ModelSerializer):
+    product = ProductCardSerializer(source='neighbor', read_only=True)
+
+    class Meta:
+        model = ProductNeighbor
+        fields = ['product', 'score']
+
+
+class ProductPageSerializer(ProductSerializer):
+    """Everything the product page shows, without per-user flags so it can be cached."""
+    brand = BrandSerializer(read_only=True)
+    category = CategorySerializer(read_only=True)
+    galary = GalarySerializer(read_only=True)
+    related = serializers.SerializerMethodField()
+
+    class Meta(ProductSerializer.Meta):
+        fields = [
+            'id', 'name', 'details', 'is_cash', 'price', 'monthly_price', 'country',
+            'brand', 'category', 'images', 'main_image', 'discount', 'discount_price',
+            'discount_date_finished', 'properties', 'galary', 'stock', 'effective_price', 'related',
+        ]
+
+    @staticmethod
+    def setup_queryset(queryset):
+        return queryset.select_related('brand', 'category', 'galary').prefetch_related(
+            'image_set', 'propertytype_set__property_set',
+        )
+
+    def get_related(self, obj):
+        related = self.context.get('related', [])
+        return ProductCardSerializer(related, many=True, context={'request': self.context['request']}).data
+
+class LikedProductSerializer(ProductSerializer):
+    class Meta(ProductSerializer.Meta):
+        fields = [
+            'id', 'name', 'is_cash', 'price', 'monthly_price', 'discount', 'discount_price',
+            'effective_price', 'stock', 'category_name', 'main_image', 'like', 'like_id', 'is_cart', 'versus',
+        ]
+
+
+class LikedItemListSerializer(CardFragmentMixin, serializers.ModelSerializer):
+    product = LikedProductSerializer(read_only=True)
+
     class Meta:
         model = LikedItem
         fields = ['id','user', 'product']
         read_only_fields = ['user']
+        list_serializer_class = CardFragmentListSerializer
 
-class VersusItemSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        # Ro'yxatdagi mahsulot albatta yoqtirilgan, like uchun alohida so'rov kerak emas
+        instance.product.liked_id = instance.id
+        return super().to_representation(instance)
+
+    def fill_fragment(self, row, fragment):
+        row['product'] = self.fields['product'].fill_fragment(row['product'], fragment)
+        return row
+
+class VersusItemSerializer(CardFragmentMixin, serializers.ModelSerializer):
     product_properties = serializers.SerializerMethodField()
     product_name = serializers.SerializerMethodField()
     product_price = serializers.SerializerMethodField()
     product_image = serializers.SerializerMethodField()
 
+    fragment_fields = ('product_image', 'product_properties')
+
     class Meta:
         model = VersusItem
         fields = ['id', 'product','product_name' , 'product_price' , 'product_image' , 'product_properties']
+        list_serializer_class = CardFragmentListSerializer
+
+    def fragment_values(self, fragment):
+        return {
+            'product_image': fragment['main_image'],
+            'product_properties': [value for property_type in fragment['properties'] for value in property_type['value']],
+        }
 
     def get_product_properties(self, obj):
         properties = Property.objects.filter(property_type__product=obj.product)
@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .blobs import FILE_FIELDS, decref, file_names, incref
+from .cache import bump_version, bump_versions
+from .counters import popularity
+from .models import Brand, CartItem, Category, Galary, Image, LikedItem, Message, Product, Property, PropertyType, User
+from .streams import mark_new_message
+from .suggestions import product_weight, suggestions
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    bump_version(f'user:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Image)
+@receiver([post_save, post_delete], sender=Galary)
+@receiver([post_save, post_delete], sender=PropertyType)
+@receiver([post_save, post_delete], sender=Property)
+def invalidate_catalog(sender, instance, **kwargs):
+    bump_version('catalog')
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_page(sender, instance, **kwargs):
+    bump_version(f'product:{instance.pk}')
+
+
+@receiver(post_save, sender=Category)
+def invalidate_product_cards_of_category(sender, instance, created, **kwargs):
+    # Kartochka fragmentlarida category_name bor
+    if not created:
+        bump_versions(f'product:{pk}' for pk in Product.objects.filter(category=instance).values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Image)
+@receiver([post_save, post_delete], sender=PropertyType)
+def invalidate_product_page_of_related(sender, instance, **kwargs):
+    bump_version(f'product:{instance.product_id}')
+
+
+@receiver([post_save, post_delete], sender=Property)
+def invalidate_product_page_of_property(sender, instance, **kwargs):
+    product_id = PropertyType.objects.filter(pk=instance.property_type_id).values_list('product_id', flat=True).first()
+    if product_id is not None:
+        bump_version(f'product:{product_id}')
+
+
+SUGGESTION_KINDS = {Product: 'product', Brand: 'brand', Category: 'category'}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def index_suggestion(sender, instance, **kwargs):
+    weight = product_weight(instance) if sender is Product else None
+    transaction.on_commit(lambda: suggestions.update(SUGGESTION_KINDS[sender], instance.pk, instance.name, weight))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def unindex_suggestion(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: suggestions.update(SUGGESTION_KINDS[sender], pk))
+
+
+@receiver(post_save, sender=Message)
+def notify_message_listeners(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: mark_new_message(instance))
+
+
+@receiver(post_save, sender=LikedItem)
+def count_like(sender, instance, created, **kwargs):
+    if created:
+        popularity.add_on_commit(instance.product_id, 'likes')
+
+
+@receiver(post_delete, sender=LikedItem)
+def count_unlike(sender, instance, **kwargs):
+    popularity.add_on_commit(instance.product_id, 'likes', -1)
+
+
+@receiver(post_save, sender=CartItem)
+def count_cart_add(sender, instance, created, **kwargs):
+    if created:
+        popularity.add_on_commit(instance.product_id, 'cart_adds')
+
+
+def remember_files(sender, instance, update_fields=None, **kwargs):
+    fields = FILE_FIELDS[sender]
+    if instance._state.adding or (update_fields is not None and not set(fields) & set(update_fields)):
+        instance._saved_files = None
+        return
+    instance._saved_files = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+def count_file_references(sender, instance, created, **kwargs):
+    old = getattr(instance, '_saved_files', None)
+    if not created and old is None:
+        return
+    for field, name in file_names(instance, FILE_FIELDS[sender]).items():
+        previous = (old.get(field) or None) if old else None
+        if name != previous:
+            incref(name)
+            decref(previous)
+
+
+def release_files(sender, instance, **kwargs):
+    for name in file_names(instance, FILE_FIELDS[sender]).values():
+        decref(name)
+
+
+for model in FILE_FIELDS:
+    pre_save.connect(remember_files, sender=model)
+    post_save.connect(count_file_references, sender=model)
+    post_delete.connect(release_files, sender=model)
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file as ``blobs/<aa>/<sha256><ext>`` whatever its field's
+    ``upload_to``, so identical uploads share one file on disk. A name never
+    changes content, which also makes blob URLs safe to cache as immutable.
+    Files are removed by ``main.blobs`` once no row refers to them.
+    """
+    prefix = 'blobs'
+
+    def get_available_name(self, name, max_length=None):
+        # Bir xil nom = bir xil tarkib, tasodifiy qo'shimcha kerak emas
+        return name
+
+    def blob_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        return f'{self.prefix}/{digest[:2]}/{digest}{extension}'
+
+    def is_blob(self, name):
+        return bool(name) and name.startswith(f'{self.prefix}/')
+
+    def _save(self, name, content):
+        directory = self.path(self.prefix)
+        os.makedirs(directory, exist_ok=True)
+
+        # Hash yozish bilan bir o'tishda hisoblanadi, nom esa oxirida ma'lum bo'ladi
+        hasher = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    temp.write(chunk)
+            return self.adopt(temp_path, name, hasher.hexdigest())
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def adopt(self, path, name, digest):
+        """
+        Moves a local file whose sha256 is already known into place, or drops
+        it when the blob exists. ``path`` must be on the same filesystem.
+        """
+        blob = self.blob_name(digest, name)
+        full_path = self.path(blob)
+        if os.path.exists(full_path):
+            # Yosh bo'yicha tozalash (dedupe_media --prune) qayta yuklangan blob'ga tegmasin
+            os.utime(full_path)
+            os.remove(path)
+            return blob
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        os.replace(path, full_path)
+        return blob
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Message
+
+
+def last_message_key(user_id):
+    return f'messages:last:{user_id}'
+
+
+def mark_new_message(message):
+    cache.set(last_message_key(message.user_id), message.pk, None)
+
+
+async def fetch_messages(user_id, after):
+    queryset = Message.objects.filter(user_id=user_id, id__gt=after).order_by('id')
+    return [message async for message in queryset[:settings.MESSAGE_STREAM['BATCH_SIZE']]]
+
+
+async def wait_for_messages(user_id, after, timeout):
+    """
+    Waits up to ``timeout`` seconds for messages of ``user_id`` newer than
+    ``after``. Each wake-up reads the last-id marker that ``main.signals``
+    sets on commit and only queries the table once it moves past ``after``.
+
+    The marker needs a shared cache (REDIS_URL): with LocMem every worker
+    only sees its own writes. It is also set only from ``post_save``, so
+    rows from ``bulk_create``/``update`` don't move it. Every
+    ``DB_CHECK_TICKS`` wake-ups the table is checked anyway.
+    """
+    options = settings.MESSAGE_STREAM
+    key = last_message_key(user_id)
+    deadline = time.monotonic() + timeout
+    tick = 0
+    while True:
+        marker = await cache.aget(key)
+        db_check = tick and tick % options['DB_CHECK_TICKS'] == 0
+        if marker is None or marker > after or db_check:
+            messages = await fetch_messages(user_id, after)
+            if messages:
+                return messages
+            if marker is None:
+                # Marker cache'dan o'chib ketgan bo'lsa, keyingi uyg'onishlar yana bo'sh so'rov yubormasin.
+                # Muddati DB tekshiruvi oralig'iga teng: boshqa jarayon siljitmagan lokal marker ham yangilanadi
+                await cache.aadd(key, after, options['POLL_INTERVAL'] * options['DB_CHECK_TICKS'])
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return []
+        tick += 1
+        await asyncio.sleep(min(options['POLL_INTERVAL'], remaining))
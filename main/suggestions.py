@@ -0,0 +1,161 @@
+import heapq
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Brand, Category, Product
+
+WORD_START = re.compile(r'\w+')
+
+
+def popularity_expression(prefix=''):
+    return (F(f'{prefix}orders') * 5 + F(f'{prefix}cart_adds') * 3
+            + F(f'{prefix}likes') * 2 + F(f'{prefix}views'))
+
+
+def product_weight(product):
+    return product.orders * 5 + product.cart_adds * 3 + product.likes * 2 + product.views
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def index_keys(label):
+    # "Samsung Galaxy S24" -> "samsung galaxy s24", "galaxy s24", "s24": har bir so'z boshidan qidiriladi
+    text = normalize(label)
+    return {text[match.start():] for match in WORD_START.finditer(text)}
+
+
+def load_entries():
+    products = Product.objects.annotate(weight=popularity_expression()).values_list('pk', 'name', 'weight')
+    # Brend va kategoriya og'irligi -- ulardagi mahsulotlar mashhurligi yig'indisi
+    related_weight = Coalesce(Sum(popularity_expression('product__')), 0)
+    brands = Brand.objects.annotate(weight=related_weight).values_list('pk', 'name', 'weight')
+    categories = Category.objects.annotate(weight=related_weight).values_list('pk', 'name', 'weight')
+    for kind, rows in (('product', products), ('brand', brands), ('category', categories)):
+        for pk, name, weight in rows:
+            yield kind, pk, name, weight
+
+
+class SuggestionIndex:
+    """
+    Per-process prefix index over product, brand and category names for
+    search-as-you-type. Keys are kept in a sorted list and searched with
+    ``bisect``; matches are ranked by popularity weight. Built in the
+    background at startup (``core.wsgi``/``core.asgi``), patched in place
+    from model signals in this process and rebuilt every
+    ``REBUILD_INTERVAL`` seconds so changes made by other processes and the
+    popularity counters catch up. Requests never build it themselves.
+    """
+
+    def __init__(self):
+        self._keys = None  # sorted [(key, kind, pk)]
+        self._items = {}  # {(kind, pk): (label, weight)}
+        self._built_at = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+        self._pending = None  # qayta qurish paytida kelgan update()'lar
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # Fork'dan keyin fon thread'i bolada yo'q, bayroqlar qotib qolmasin
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+        self._pending = None
+
+    def build(self):
+        with self._build_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                keys, items = [], {}
+                for kind, pk, label, weight in load_entries():
+                    items[kind, pk] = (label, weight)
+                    keys.extend((key, kind, pk) for key in index_keys(label))
+                keys.sort()
+            finally:
+                with self._lock:
+                    pending, self._pending = self._pending, None
+            with self._lock:
+                self._keys, self._items = keys, items
+                # DB o'qilayotganda kelgan o'zgarishlar yo'qolmasin (qayta qo'llash idempotent)
+                for change in pending:
+                    self._apply(*change)
+                self._built_at = time.monotonic()
+
+    def refresh(self):
+        """Rebuild in a background thread unless one is already running."""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.build()
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            close_old_connections()
+
+    def clear(self):
+        with self._lock:
+            self._keys, self._items = None, {}
+
+    def search(self, query, limit):
+        prefix = normalize(query)
+        if len(prefix) < settings.SUGGESTIONS['MIN_PREFIX']:
+            return []
+        if self._keys is None or time.monotonic() - self._built_at > settings.SUGGESTIONS['REBUILD_INTERVAL']:
+            self.refresh()
+
+        with self._lock:
+            keys, items = self._keys, self._items
+            if keys is None:
+                return []
+            matches = set()
+            for i in range(bisect_left(keys, (prefix,)), len(keys)):
+                key, kind, pk = keys[i]
+                if not key.startswith(prefix):
+                    break
+                matches.add((kind, pk))
+            best = heapq.nlargest(limit, matches, key=lambda match: (items[match][1], match[0] == 'product', -match[1]))
+            return [{'type': kind, 'id': pk, 'name': items[kind, pk][0]} for kind, pk in best]
+
+    def update(self, kind, pk, label=None, weight=None):
+        """Replace (or with ``label=None`` drop) one entry; a no-op until the index is built."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((kind, pk, label, weight))
+            if self._keys is not None:
+                self._apply(kind, pk, label, weight)
+
+    def _apply(self, kind, pk, label, weight):
+        # self._lock ushlangan holda; faqat shu yozuvning kalitlari bisect bilan o'chiriladi/qo'shiladi
+        keys = self._keys
+        old = self._items.pop((kind, pk), None)
+        if old is not None:
+            for key in index_keys(old[0]):
+                i = bisect_left(keys, (key, kind, pk))
+                if i < len(keys) and keys[i] == (key, kind, pk):
+                    del keys[i]
+        if label is not None:
+            if weight is None:
+                weight = old[1] if old else 0
+            self._items[kind, pk] = (label, weight)
+            for key in index_keys(label):
+                insort(keys, (key, kind, pk))
+
+
+suggestions = SuggestionIndex()
@@ -1,3 +1,1465 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import schema
+from core.routers import PrimaryReplicaRouter, ReplicaPinMiddleware, RoutingState, _routing, is_pinned
+from .authentication import CachedJWTAuthentication, local_users
+from .cache import bump_version, get_version
+from .counters import CounterBuffer, popularity
+from .fragments import local_fragments
+from .inventory import release_expired_reservations
+from .middleware import CompressionMiddleware, ConcurrencyLimitMiddleware
+from .recommendations import refresh_recommendations
+from .models import *
+from .renderers import FastJSONRenderer
+from .serializers import ProductSerializer, TokenObtainPairWithClaimsSerializer
+from .suggestions import load_entries, suggestions
+from .throttling import blocked as throttle_blocks
+from .uploads import hashers as upload_hashers
+
+
+CHECKOUT_DATA = {
+    'first_name': 'Ali',
+    'last_name': 'Valiyev',
+    'phone_number': '+998901234567',
+    'address': 'Toshkent',
+    'payment_type': 'cash',
+}
+
+
+def create_product(**kwargs):
+    category = Category.objects.create(name='Telefonlar')
+    brand = Brand.objects.create(name='Samsung', category=category)
+    defaults = {
+        'name': 'Galaxy', 'details': '-', 'price': 100, 'monthly_price': 10,
+        'country': 'UZ', 'brand': brand, 'category': category,
+    }
+    defaults.update(kwargs)
+    return Product.objects.create(**defaults)
+
+
+def checkout(user, cart_items):
+    client = APIClient()
+    client.force_authenticate(user)
+    data = dict(CHECKOUT_DATA, cart_item_ids=[item.id for item in cart_items])
+    return client.post('/orders/create', data, format='json')
+
+
+class StockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ali', password='secret')
+        self.product = create_product(stock=5)
+        self.addCleanup(popularity.flush)
+
+    def test_checkout_decrements_stock(self):
+        item = CartItem.objects.create(user=self.user, product=self.product, amount=3)
+        response = checkout(self.user, [item])
+
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+        self.assertEqual(Order.objects.get().total_price, 300)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_short_line_rolls_back_whole_order(self):
+        other = create_product(name='Redmi', stock=1)
+        items = [
+            CartItem.objects.create(user=self.user, product=self.product, amount=2),
+            CartItem.objects.create(user=self.user, product=other, amount=2),
+        ]
+        response = checkout(self.user, items)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([int(pk) for pk in response.data['products']], [other.id])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_sold_stock_refreshes_cached_catalog(self):
+        self.assertEqual(Client().get(f'/products/{self.product.id}/page/').json()['stock'], 5)
+        self.assertEqual(Client().get('/products/').json()['results'][0]['stock'], 5)
+        item = CartItem.objects.create(user=self.user, product=self.product, amount=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(self.user, [item])
+
+        self.assertEqual(Client().get(f'/products/{self.product.id}/page/').json()['stock'], 0)
+        self.assertEqual(Client().get('/products/').json()['results'][0]['stock'], 0)
+
+    def test_untracked_stock_is_not_checked(self):
+        untracked = create_product(name='Redmi')
+        item = CartItem.objects.create(user=self.user, product=untracked, amount=100)
+
+        self.assertEqual(checkout(self.user, [item]).status_code, 201)
+        untracked.refresh_from_db()
+        self.assertIsNone(untracked.stock)
+
+    def test_reservation_holds_stock_until_checkout(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/cart-items/create', {'product': self.product.id, 'amount': 4, 'reserve': True}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(response.data['reserved_until'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+        response = checkout(self.user, CartItem.objects.all())
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_reservation_rejected_when_short(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/cart-items/create', {'product': self.product.id, 'amount': 6, 'reserve': True}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_expired_reservations_are_released(self):
+        CartItem.objects.create(
+            user=self.user, product=self.product, amount=2,
+            reserved_until=timezone.now() - timedelta(minutes=1),
+        )
+        Product.objects.filter(pk=self.product.pk).update(stock=3)
+
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(release_expired_reservations(), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+
+class EffectivePriceTests(TestCase):
+    def test_effective_price_follows_active_discount(self):
+        product = create_product(discount_price=80, discount_date_finished=timezone.localdate())
+        self.assertEqual(product.effective_price, 80)
+
+        product.discount_date_finished = timezone.localdate() - timedelta(days=1)
+        product.save(update_fields=['discount_date_finished'])
+        product.refresh_from_db()
+        self.assertEqual(product.effective_price, 100)
+
+    def test_expire_discounts_resets_expired_rows(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        expired = create_product(discount=20, discount_price=80, discount_date_finished=yesterday)
+        active = create_product(discount=10, discount_price=90, discount_date_finished=timezone.localdate())
+        Product.objects.filter(pk=expired.pk).update(effective_price=80)
+        version = get_version(f'product:{expired.pk}')
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('expire_discounts', stdout=StringIO())
+        # UPDATE sanani filtr bilan oladi, pk ro'yxati bilan emas
+        update = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE'))
+        self.assertNotIn(' IN (', update)
+        self.assertNotEqual(get_version(f'product:{expired.pk}'), version)
+
+        expired.refresh_from_db()
+        active.refresh_from_db()
+        self.assertIsNone(expired.discount_price)
+        self.assertEqual(expired.effective_price, 100)
+        self.assertEqual(active.effective_price, 90)
+
+
+class ProductFilterTests(TestCase):
+    def setUp(self):
+        self.cheap = create_product(name='Cheap', price=50)
+        self.sale = create_product(name='Sale', price=300, discount_price=150)
+        self.premium = create_product(name='Premium', price=500, is_cash=False)
+
+    def get_names(self, query):
+        response = APIClient().get('/products/', query)
+        self.assertEqual(response.status_code, 200)
+        return sorted(product['name'] for product in response.data['results'])
+
+    def test_price_ranges(self):
+        self.assertEqual(self.get_names({'price_min': 100, 'price_max': 400}), ['Sale'])
+        self.assertEqual(self.get_names({'effective_price_max': 200}), ['Cheap', 'Sale'])
+
+    def test_multi_value_and_flags(self):
+        ids = f'{self.cheap.brand_id},{self.premium.brand_id}'
+        self.assertEqual(self.get_names({'brand__in': ids}), ['Cheap', 'Premium'])
+        self.assertEqual(self.get_names({'category__in': self.sale.category_id}), ['Sale'])
+        self.assertEqual(self.get_names({'is_cash': 'false'}), ['Premium'])
+        self.assertEqual(self.get_names({'discount_active': 'true'}), ['Sale'])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        self.user = User.objects.create_user(username='ali', password='secret', isadmin=True)
+        token = APIClient().post('/token/', {'username': 'ali', 'password': 'secret'}).data['access']
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_user_is_loaded_once(self):
+        self.client.get('/users/me')
+        # Faqat profilning o'zi o'qiladi, autentifikatsiya bazaga tushmaydi
+        with self.assertNumQueries(1):
+            response = self.client.get('/users/me')
+        self.assertEqual(response.data['username'], 'ali')
+
+    def test_cache_keeps_only_auth_fields(self):
+        self.client.get('/users/me')
+        key = f'jwt-user:{self.user.pk}:{get_version(f"user:{self.user.pk}")}'
+        self.assertEqual(cache.get(key), (self.user.pk, 'ali', True, True))
+
+        user = CachedJWTAuthentication().get_user({'user_id': self.user.pk})
+        self.assertEqual((user.pk, user.username, user.isadmin), (self.user.pk, 'ali', True))
+        self.assertIn('password', user.get_deferred_fields())
+
+    def test_saving_user_invalidates_cache(self):
+        self.client.get('/users/me')
+        self.user.first_name = 'Ali'
+        self.user.save()
+        self.assertEqual(self.client.get('/users/me').data['first_name'], 'Ali')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/users/me').status_code, 401)
+
+    def test_catalog_uses_token_claims(self):
+        # Faqat COUNT: brend yo'q, foydalanuvchi ham bazadan o'qilmaydi
+        with self.assertNumQueries(1):
+            response = self.client.get('/brands/')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(REPLICA_DATABASES=['replica_1'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.token = _routing.set(RoutingState())
+
+    def tearDown(self):
+        _routing.reset(self.token)
+
+    def test_reads_leave_replica_after_a_write(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        _routing.get().use_replica = True
+        self.assertEqual(self.router.db_for_read(Product), 'replica_1')
+        self.router.db_for_write(CartItem)
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_write_pins_user_to_primary(self):
+        cache.clear()
+        user = User.objects.create_user(username='ali', password='secret')
+        product = create_product()
+        client = APIClient()
+        client.force_authenticate(user)
+
+        self.assertFalse(is_pinned(user))
+        client.post('/liked-items/add/', {'product': product.id}, format='json')
+        self.assertTrue(is_pinned(user))
+
+
+# DB_REPLICAS=replica.sqlite3 python manage.py test main.tests.ReplicaReadTests
+@skipUnless(settings.REPLICA_DATABASES, 'DB_REPLICAS is not configured')
+class ReplicaReadTests(TransactionTestCase):
+    databases = {'default', *settings.REPLICA_DATABASES}
+
+    def test_catalog_reads_hit_replica(self):
+        replica = settings.REPLICA_DATABASES[0]
+        with self.assertNumQueries(1, using=replica):
+            APIClient().get('/brands/')
+        with self.assertNumQueries(0, using=replica):
+            APIClient().get('/users/')
+
+
+class FastJSONRendererTests(TestCase):
+    def test_output_matches_drf_renderer(self):
+        data = {
+            'price': Decimal('10.50'),
+            'created_at': timezone.now(),
+            'date': timezone.localdate(),
+            'name': gettext_lazy('Telefonlar'),
+            'text': 'Line\u2028separator',
+            1: [None, True, 1.5],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser_rejects_invalid_json(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='ali', password='secret'))
+        response = client.post('/liked-items/add/', b'{"product": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ali', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            product = create_product(name=f'Galaxy {i}')
+            Image.objects.create(product=product, main=True, image='images/galaxy.png')
+            property_type = PropertyType.objects.create(title='Ekran', product=product)
+            Property.objects.create(title='Diagonal', value='6.5', property_type=property_type)
+            LikedItem.objects.create(user=self.user, product=product)
+
+    def test_fields_limit_output(self):
+        response = self.client.get('/products/', {'fields': 'id,name,main_image'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'main_image'})
+        self.assertTrue(response.data['results'][0]['main_image'].endswith('/media/images/galaxy.png'))
+
+    def test_expand_nests_brand(self):
+        response = self.client.get('/products/', {'fields': 'id', 'expand': 'brand'})
+        self.assertEqual(response.data['results'][0]['brand']['name'], 'Samsung')
+
+    def test_full_product_list_runs_constant_queries(self):
+        # count, mahsulotlar (kategoriya va flaglar bilan), rasmlar, xususiyat turlari, xususiyatlar
+        with self.assertNumQueries(5):
+            response = self.client.get('/products/')
+        self.assertTrue(all(product['like'] for product in response.data['results']))
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        for i in range(10):
+            create_product(name=f'Galaxy {i}', details='Ekran 6.5, 5000 mAh batareya. ' * 5)
+
+    def test_catalog_response_is_compressed_and_cached(self):
+        client = APIClient()
+        first = client.get('/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', first['Vary'])
+        body = gzip.decompress(first.content)
+
+        with self.assertNumQueries(0):
+            second = client.get('/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertIn('gzip', second.precompressed)
+        self.assertEqual(gzip.decompress(second.content), body)
+
+    def test_catalog_change_invalidates_cache(self):
+        client = APIClient()
+        client.get('/products/')
+        create_product(name='Yangi')
+        self.assertEqual(client.get('/products/').data['count'], 11)
+
+    def test_small_and_unaccepted_responses_are_untouched(self):
+        response = APIClient().get('/brands/?category=0', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = APIClient().get('/products/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_html_pages_with_csrf_tokens_are_not_compressed(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret'))
+        response = self.client.get('/admin/main/product/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class CatalogCacheTests(TestCase):
+    def test_hosts_get_their_own_absolute_urls(self):
+        Image.objects.create(product=create_product(), image='images/galaxy.png', main=True)
+        client = APIClient()
+        first = client.get('/images/', HTTP_HOST='a.example.com')
+        second = client.get('/images/', HTTP_HOST='b.example.com')
+        self.assertTrue(first.json()['results'][0]['image'].startswith('http://a.example.com/media/'))
+        self.assertTrue(second.json()['results'][0]['image'].startswith('http://b.example.com/media/'))
+
+    def test_invalid_token_is_rejected_on_a_warm_cache(self):
+        client = APIClient()
+        self.assertEqual(client.get('/property-types/').status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION='Bearer garbage')
+        self.assertEqual(client.get('/property-types/').status_code, 401)
+
+
+class AdminQueryTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='secret')
+        self.client.force_login(self.admin)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_change_pages_do_not_grow_with_rows(self):
+        product = create_product()
+        order = Order.objects.create(user=self.admin, total_price=0, phone_number='1', first_name='A',
+                                     last_name='B', payment_type='cash', region='', city='', address='')
+        # ContentType va boshqa jarayon ichidagi keshlarni isitish
+        self.count_queries(f'/admin/main/product/{product.id}/change/')
+        self.count_queries(f'/admin/main/order/{order.id}/change/')
+        counts = []
+        for _ in range(2):
+            for _ in range(5):
+                Image.objects.create(product=product, image='images/galaxy.png')
+                OrderItem.objects.create(order=order, product=product, amount=1)
+            counts.append((
+                self.count_queries(f'/admin/main/product/{product.id}/change/'),
+                self.count_queries(f'/admin/main/order/{order.id}/change/'),
+            ))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_list_pages_do_not_grow_with_rows(self):
+        self.count_queries('/admin/main/product/')
+        counts = []
+        for _ in range(2):
+            for _ in range(5):
+                product = create_product()
+                Image.objects.create(product=product, image='images/galaxy.png')
+            counts.append([self.count_queries(f'/admin/main/{model}/') for model in ('product', 'image', 'brand')])
+        self.assertEqual(counts[0], counts[1])
+
+
+class MessageFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ali', password='secret')
+        token = APIClient().post('/token/', {'username': 'ali', 'password': 'secret'}).data['access']
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def add_message(self, text='salom'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(user=self.user, message=text)
+
+    def test_history_is_cursor_paginated(self):
+        Message.objects.bulk_create(Message(user=self.user, message=str(i)) for i in range(35))
+        response = self.client.get('/messages/', **self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 30)
+        self.assertEqual(response.data['results'][0]['message'], '34')
+        self.assertNotIn('count', response.data)
+
+        response = self.client.get(response.data['next'], **self.auth)
+        self.assertEqual([m['message'] for m in response.data['results']], ['4', '3', '2', '1', '0'])
+
+    def test_poll_returns_new_messages_only(self):
+        first = self.add_message()
+        second = self.add_message('yangi')
+
+        response = self.client.get('/messages/poll/', {'after': first.id, 'timeout': 0}, **self.auth)
+        self.assertEqual(response.json()['last_id'], second.id)
+        self.assertEqual([m['message'] for m in response.json()['results']], ['yangi'])
+
+        # Marker o'zgarmagan bo'lsa jadvalga so'rov yuborilmaydi
+        with self.assertNumQueries(0):
+            response = self.client.get('/messages/poll/', {'after': second.id, 'timeout': 0}, **self.auth)
+        self.assertEqual(response.json(), {'last_id': second.id, 'results': []})
+
+    @override_settings(MESSAGE_STREAM=dict(settings.MESSAGE_STREAM, POLL_INTERVAL=0.01, DB_CHECK_TICKS=3))
+    def test_poll_sees_rows_that_did_not_move_the_marker(self):
+        first = self.add_message()
+        Message.objects.bulk_create([Message(user=self.user, message='bulk')])
+
+        response = self.client.get('/messages/poll/', {'after': first.id, 'timeout': 1}, **self.auth)
+        self.assertEqual([m['message'] for m in response.json()['results']], ['bulk'])
+
+    def test_project_middleware_runs_natively_under_asgi(self):
+        async def get_response(request):
+            return HttpResponse(b'x' * 1000, content_type='application/json')
+
+        for middleware in (ConcurrencyLimitMiddleware, CompressionMiddleware, ReplicaPinMiddleware):
+            self.assertTrue(iscoroutinefunction(middleware(get_response)))
+        compression = CompressionMiddleware(get_response)
+        response = async_to_sync(compression)(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_poll_requires_authentication(self):
+        self.assertEqual(self.client.get('/messages/poll/', {'timeout': 0}).status_code, 401)
+
+    def test_deactivated_user_loses_the_feed(self):
+        self.assertEqual(self.client.get('/messages/poll/', {'timeout': 0}, **self.auth).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/messages/poll/', {'timeout': 0}, **self.auth).status_code, 401)
+
+    @override_settings(MESSAGE_STREAM=dict(settings.MESSAGE_STREAM, STREAM_TIMEOUT=0.1))
+    def test_stream_resumes_from_last_event_id(self):
+        first = self.add_message()
+        second = self.add_message('yangi')
+
+        response = self.client.get('/messages/stream/', HTTP_LAST_EVENT_ID=str(first.id), **self.auth)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response).decode()
+        self.assertIn(f'id: {second.id}\nevent: message\n', body)
+        self.assertNotIn(f'id: {first.id}\n', body)
+
+
+class TemporaryMediaMixin:
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media,
+            CHUNKED_UPLOADS=dict(settings.CHUNKED_UPLOADS, TEMP_DIR=os.path.join(self.media, 'partial')),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class ChunkedUploadTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='ali', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.content = os.urandom(150 * 1024)
+
+    def put_chunk(self, upload_id, start, end):
+        return self.client.generic(
+            'PUT', f'/uploads/{upload_id}/', self.content[start:end], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(self.content)}',
+        )
+
+    def test_resumable_upload_attaches_file_to_message(self):
+        response = self.client.post('/uploads/', {'target': 'message', 'filename': '../hisobot.pdf', 'size': len(self.content)})
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data['id']
+
+        self.assertEqual(self.put_chunk(upload_id, 0, 100000).data['offset'], 100000)
+        response = self.put_chunk(upload_id, 0, 100000)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 100000)
+
+        # Boshqa jarayonda davom etish: hash diskdagi qismdan tiklanadi
+        upload_hashers.clear()
+        self.assertEqual(self.client.get(f'/uploads/{upload_id}/').data['offset'], 100000)
+        self.assertEqual(self.put_chunk(upload_id, 100000, len(self.content)).status_code, 200)
+
+        response = self.client.post(f'/uploads/{upload_id}/finalize/', {'message': 'hisobot'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(self.content).hexdigest())
+
+        message = Message.objects.get()
+        self.assertEqual(message.user, self.user)
+        self.assertEqual(message.file.name, f'blobs/{response.data["sha256"][:2]}/{response.data["sha256"]}.pdf')
+        with message.file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(Upload.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media, 'partial')), [])
+
+    def test_dead_writer_does_not_move_the_offset(self):
+        upload_id = self.client.post('/uploads/', {'target': 'message', 'filename': 'a.bin', 'size': len(self.content)}).data['id']
+        self.put_chunk(upload_id, 0, 100000)
+
+        # Worker bo'lak o'rtasida o'ldi: claim qoldi, qism fayl offset'dan uzun, offset esa joyida
+        Upload.objects.filter(pk=upload_id).update(writing_until=timezone.now() + timedelta(minutes=5))
+        with open(os.path.join(self.media, 'partial', f'{upload_id}.part'), 'ab') as part:
+            part.write(b'\0' * 1000)
+        self.assertEqual(self.put_chunk(upload_id, 100000, len(self.content)).status_code, 409)
+        self.assertEqual(self.client.get(f'/uploads/{upload_id}/').data['offset'], 100000)
+
+        Upload.objects.filter(pk=upload_id).update(writing_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.put_chunk(upload_id, 100000, len(self.content)).status_code, 200)
+        response = self.client.post(f'/uploads/{upload_id}/finalize/', {'message': '-'}, format='json')
+        self.assertEqual(response.data['sha256'], hashlib.sha256(self.content).hexdigest())
+
+    def test_failed_save_keeps_the_upload(self):
+        upload_id = self.client.post('/uploads/', {'target': 'message', 'filename': 'a.bin', 'size': len(self.content)}).data['id']
+        self.put_chunk(upload_id, 0, len(self.content))
+
+        with mock.patch.object(Message, 'save', side_effect=OperationalError), self.assertRaises(OperationalError):
+            self.client.post(f'/uploads/{upload_id}/finalize/', {'message': '-'}, format='json')
+        self.assertTrue(os.path.exists(os.path.join(self.media, 'partial', f'{upload_id}.part')))
+
+        response = self.client.post(f'/uploads/{upload_id}/finalize/', {'message': '-'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        with Message.objects.get().file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_finalize_requires_all_chunks(self):
+        response = self.client.post('/uploads/', {'target': 'message', 'filename': 'a.txt', 'size': len(self.content)})
+        self.put_chunk(response.data['id'], 0, 1000)
+
+        response = self.client.post(f'/uploads/{response.data["id"]}/finalize/', {'message': '-'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Message.objects.exists())
+
+    def test_image_target_is_admin_only(self):
+        response = self.client.post('/uploads/', {'target': 'image', 'filename': 'a.png', 'size': 10})
+        self.assertEqual(response.status_code, 400)
+
+
+class BlobStorageTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = create_product()
+
+    def upload(self, name, content=b'rasm'):
+        return SimpleUploadedFile(name, content)
+
+    def test_identical_uploads_share_one_blob(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Image.objects.create(product=self.product, image=self.upload('a.png'))
+            second = Image.objects.create(product=self.product, image=self.upload('b.PNG'))
+            category = Category.objects.create(name='Aksessuarlar', icon=self.upload('icon.png'))
+
+        digest = hashlib.sha256(b'rasm').hexdigest()
+        self.assertEqual({first.image.name, second.image.name, category.icon.name}, {f'blobs/{digest[:2]}/{digest}.png'})
+        self.assertEqual(Blob.objects.get().refs, 3)
+        self.assertEqual(len(os.listdir(os.path.join(self.media, 'blobs', digest[:2]))), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            category.icon = self.upload('icon.png', b'boshqa')
+            category.save()
+        self.assertTrue(os.path.exists(second.image.path))
+        self.assertEqual(Blob.objects.get(name=second.image.name).refs, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(second.image.path))
+        self.assertFalse(Blob.objects.filter(name=second.image.name).exists())
+
+    def test_dedupe_media_moves_legacy_files(self):
+        for name in ('images/a.png', 'images/a_MiGHE4F.png'):
+            path = os.path.join(self.media, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'rasm')
+            Image.objects.create(product=self.product, image=name)
+
+        call_command('dedupe_media', stdout=StringIO())
+
+        names = set(Image.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(Blob.objects.get(name=names.pop()).refs, 2)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'images')), [])
+
+    def test_dedupe_media_crash_leaves_rows_on_existing_files(self):
+        path = os.path.join(self.media, 'images', 'a.png')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'rasm')
+        image = Image.objects.create(product=self.product, image='images/a.png')
+
+        with mock.patch.object(Image.objects, 'filter', side_effect=OperationalError), \
+                self.assertRaises(OperationalError):
+            call_command('dedupe_media', stdout=StringIO())
+        image.refresh_from_db()
+        self.assertTrue(os.path.exists(image.image.path))
+
+        call_command('dedupe_media', stdout=StringIO())
+        image.refresh_from_db()
+        self.assertTrue(image.image.name.startswith('blobs/'))
+        self.assertTrue(os.path.exists(image.image.path))
+        self.assertFalse(os.path.exists(path))
+
+
+class ProductPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Kutilayotgan flush so'rovlar sonini buzmasin, qolgani test tranzaksiyasida yoziladi
+        popularity.flush()
+        self.addCleanup(popularity.flush)
+        self.product = create_product()
+
+    def add_rows(self):
+        Image.objects.create(product=self.product, image='images/galaxy.png', main=True)
+        spec = PropertyType.objects.create(title='Ekran', product=self.product)
+        Property.objects.create(title='Diagonal', value='6.5', property_type=spec)
+        related = Product.objects.create(
+            name='Galaxy S', details='-', price=200, monthly_price=20, country='UZ',
+            brand=self.product.brand, category=self.product.category,
+        )
+        Image.objects.create(product=related, image='images/s.png', main=True)
+
+    def get_page(self):
+        response = self.client.get(f'/products/{self.product.id}/page/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_page_runs_fixed_queries_and_is_cached(self):
+        self.add_rows()
+        with CaptureQueriesContext(connection) as first:
+            self.get_page()
+        self.add_rows()
+        cache.clear()
+        with CaptureQueriesContext(connection) as second:
+            page = self.get_page()
+        self.assertEqual(len(first), len(second))
+
+        self.assertEqual(page['brand']['name'], 'Samsung')
+        self.assertEqual(page['properties'][0]['value'], [{'type': 'Diagonal', 'value': '6.5'}])
+        self.assertEqual(len(page['related']), 2)
+        self.assertTrue(page['related'][0]['main_image'].endswith('/media/images/s.png'))
+
+        with self.assertNumQueries(0):
+            self.get_page()
+
+    def test_property_change_invalidates_page(self):
+        self.add_rows()
+        self.get_page()
+        prop = Property.objects.get()
+        prop.value = '6.7'
+        prop.save()
+        self.assertEqual(self.get_page()['properties'][0]['value'][0]['value'], '6.7')
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ali', password='secret')
+        self.a, self.b, self.c, self.d = (create_product(name=name) for name in 'ABCD')
+
+    def order(self, *products):
+        order = Order.objects.create(user=self.user, total_price=0, **CHECKOUT_DATA, region='', city='')
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, amount=1)
+
+    def neighbors(self, product, kind='bought_together'):
+        response = self.client.get(f'/products/{product.id}/recommendations/', {'kind': kind})
+        self.assertEqual(response.status_code, 200)
+        return [(row['product']['name'], round(row['score'], 3)) for row in response.json()]
+
+    def test_full_and_incremental_refresh(self):
+        self.order(self.a, self.b)
+        self.order(self.a, self.b)
+        self.order(self.a, self.c)
+        call_command('compute_recommendations', '--full', stdout=StringIO())
+        self.assertEqual(self.neighbors(self.a), [('B', 0.816), ('C', 0.577)])
+        self.assertEqual(self.neighbors(self.d), [])
+
+        self.order(self.c, self.d)
+        # C'ning savatlari ko'paydi: A -> C bahosi ham qayta hisoblanadi
+        self.assertEqual(refresh_recommendations('bought_together'), 3)
+        self.assertEqual(self.neighbors(self.d), [('C', 0.707)])
+        self.assertEqual(self.neighbors(self.a), [('B', 0.816), ('C', 0.408)])
+        self.assertEqual(refresh_recommendations('bought_together'), 0)
+
+    def test_similar_from_likes_and_comparisons(self):
+        other = User.objects.create_user(username='vali', password='secret')
+        LikedItem.objects.create(user=self.user, product=self.a)
+        LikedItem.objects.create(user=self.user, product=self.b)
+        VersusItem.objects.create(user=other, product=self.a)
+        VersusItem.objects.create(user=other, product=self.c)
+        call_command('compute_recommendations', '--kind', 'similar', stdout=StringIO())
+
+        self.assertEqual(self.neighbors(self.a, 'similar'), [('B', 0.707), ('C', 0.707)])
+        self.assertEqual(self.client.get(f'/products/{self.a.id}/recommendations/', {'kind': 'x'}).status_code, 400)
+
+
+class PopularityCounterTests(TestCase):
+    def setUp(self):
+        popularity.flush()
+        self.addCleanup(popularity.flush)
+        self.user = User.objects.create_user(username='ali', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.product = create_product(stock=5)
+
+    def test_events_are_buffered_then_flushed_in_batches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/liked-items/add/', {'product': self.product.id}, format='json')
+            self.client.post('/cart-items/create', {'product': self.product.id, 'amount': 1}, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(self.user, CartItem.objects.all())
+        self.client.get(f'/products/{self.product.id}/page/')
+
+        stale = Product.objects.get()
+        self.assertEqual((stale.likes, stale.cart_adds, stale.orders, stale.views), (0, 0, 0, 0))
+
+        with self.assertNumQueries(1):
+            popularity.flush()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.likes, self.product.cart_adds, self.product.orders, self.product.views), (1, 1, 1, 1))
+
+        # Eski nusxani saqlash hisoblagichlarni nolga qaytarmaydi
+        stale.name = 'Galaxy S'
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.likes), ('Galaxy S', 1))
+
+    def test_unlike_never_goes_below_zero(self):
+        popularity.add(self.product.id, 'likes', -3)
+        popularity.flush()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.likes, 0)
+
+    def test_failed_flush_keeps_deltas(self):
+        popularity.add(self.product.id, 'views', 2)
+        with mock.patch.object(Product.objects, 'filter', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                popularity.flush()
+        popularity.add(self.product.id, 'views')
+
+        self.assertEqual(popularity.flush(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views, 3)
+
+    @override_settings(POPULARITY_COUNTERS=dict(settings.POPULARITY_COUNTERS, FLUSH_INTERVAL=0.05))
+    def test_timer_flushes_idle_buffer(self):
+        buffer = CounterBuffer()
+        flushed = threading.Event()
+        with mock.patch.object(buffer, 'flush', side_effect=flushed.set):
+            buffer.start()
+            self.assertTrue(flushed.wait(2))
+
+    def test_products_ordered_by_popularity(self):
+        popular = create_product(name='Popular')
+        popularity.add(popular.id, 'orders', 3)
+        popularity.add(self.product.id, 'orders')
+        popularity.flush()
+
+        response = APIClient().get('/products/', {'ordering': '-orders', 'fields': 'name'})
+        self.assertEqual([p['name'] for p in response.data['results']], ['Popular', 'Galaxy'])
+
+
+class NavigationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_menu_in_two_queries_until_catalog_changes(self):
+        phone = create_product()
+        create_product(name='Galaxy S', brand=phone.brand, category=phone.category)
+        laptop = create_product(name='Zenbook')
+        Brand.objects.create(name='Apple', category=phone.category)
+        # Boshqa kategoriyadagi mahsulot brend soniga qo'shilmaydi
+        create_product(name='Tab', brand=phone.brand)
+
+        with self.assertNumQueries(2):
+            menu = self.client.get('/navigation/').json()
+        with self.assertNumQueries(0):
+            self.client.get('/navigation/')
+
+        phone_menu = next(c for c in menu if c['id'] == phone.category_id)
+        self.assertEqual(phone_menu['product_count'], 2)
+        self.assertEqual([(b['name'], b['product_count']) for b in phone_menu['brands']], [('Apple', 0), ('Samsung', 2)])
+
+        laptop.category.name = 'Noutbuklar'
+        laptop.category.save()
+        names = [c['name'] for c in self.client.get('/navigation/').json()]
+        self.assertIn('Noutbuklar', names)
+
+    def test_category_list_ordering(self):
+        Category.objects.create(name='B')
+        Category.objects.create(name='A')
+        response = self.client.get('/categories/', {'ordering': 'name'})
+        self.assertEqual([c['name'] for c in response.json()['results']], ['A', 'B'])
+
+
+class LikedItemListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ali', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def like(self, count):
+        for _ in range(count):
+            product = create_product()
+            Image.objects.create(product=product, image='images/galaxy.png', main=True)
+            LikedItem.objects.create(user=self.user, product=product)
+        return product
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/liked-items/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_constant_queries_and_flags(self):
+        self.like(2)
+        small, _ = self.count_queries()
+        last = self.like(6)
+        CartItem.objects.create(user=self.user, product=last, amount=1)
+        large, data = self.count_queries()
+
+        self.assertEqual(small, large)
+        self.assertEqual(data['count'], 8)
+        card = data['results'][0]['product']
+        self.assertEqual(card['id'], last.id)
+        self.assertEqual((card['like'], card['like_id'], card['is_cart'], card['versus']),
+                         (True, data['results'][0]['id'], True, False))
+        self.assertTrue(card['main_image'].endswith('/media/images/galaxy.png'))
+        self.assertNotIn('properties', card)
+
+
+class SuggestionTests(TestCase):
+    def setUp(self):
+        suggestions.clear()
+        self.addCleanup(suggestions.clear)
+        self.addCleanup(popularity.flush)
+
+    def suggest(self, q, **params):
+        return [(item['type'], item['name']) for item in self.client.get('/suggestions/', {'q': q, **params}).json()['results']]
+
+    def test_word_prefixes_ranked_by_popularity_without_queries(self):
+        create_product(name='Samsung Galaxy S24', orders=1)
+        create_product(name='Galaxy Tab', orders=10)
+        create_product(name='iPhone 15')
+        suggestions.build()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('GAL'), [('product', 'Galaxy Tab'), ('product', 'Samsung Galaxy S24')])
+            self.assertEqual(self.suggest('galaxy s2'), [('product', 'Samsung Galaxy S24')])
+            self.assertEqual(self.suggest('sam', limit=1), [('brand', 'Samsung')])
+            self.assertEqual(self.suggest('i'), [])
+
+    def test_index_is_never_built_inside_a_request(self):
+        create_product(name='Galaxy Tab')
+        with mock.patch.object(suggestions, 'refresh') as refresh, self.assertNumQueries(0):
+            self.assertEqual(self.suggest('g'), [])
+            refresh.assert_not_called()
+            self.assertEqual(self.suggest('gal'), [])
+        refresh.assert_called_once_with()
+
+    def test_updates_during_a_rebuild_are_kept(self):
+        create_product(name='Galaxy Tab')
+        entries = list(load_entries())
+
+        def racing_entries():
+            # DB o'qilayotganda boshqa thread'da saqlangan mahsulot
+            suggestions.update('product', 999, 'Galaxy Fold', 1)
+            yield from entries
+
+        with mock.patch('main.suggestions.load_entries', racing_entries):
+            suggestions.build()
+        self.assertEqual(self.suggest('gal'), [('product', 'Galaxy Fold'), ('product', 'Galaxy Tab')])
+
+    def test_index_follows_model_changes(self):
+        suggestions.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            product = create_product(name='Redmi Note')
+        self.assertEqual(self.suggest('note'), [('product', 'Redmi Note')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Poco X6'
+            product.save()
+        self.assertEqual(self.suggest('note'), [])
+        self.assertEqual(self.suggest('poco'), [('product', 'Poco X6')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self.suggest('poco'), [])
+
+
+class OpenAPISchemaTests(TestCase):
+    def setUp(self):
+        schema._schema.clear()
+        self.addCleanup(schema._schema.clear)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_schema_is_built_once_per_process_without_file(self):
+        with override_settings(OPENAPI_SCHEMA_FILE=Path(self.tmp) / 'openapi.json'), \
+                mock.patch('core.schema.build_schema', wraps=schema.build_schema) as build:
+            first = self.client.get('/openapi.json')
+            second = self.client.get('/openapi.json')
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(second.content, first.content)
+        self.assertIn('/products/', first.json()['paths'])
+
+    def test_generated_file_is_served_and_root_is_cheap(self):
+        path = Path(self.tmp) / 'openapi.json'
+        call_command('generate_schema', output=str(path), stdout=StringIO())
+        with override_settings(OPENAPI_SCHEMA_FILE=path), \
+                mock.patch('core.schema.build_schema') as build:
+            self.assertEqual(self.client.get('/openapi.json').content, path.read_bytes())
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get('/').status_code, 200)
+            docs = self.client.get('/docs/', HTTP_ACCEPT='text/html')
+        build.assert_not_called()
+        self.assertContains(docs, '/openapi.json')
+
+
+class ProductFragmentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ali', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.products = [create_product(name=f'Galaxy {i}') for i in range(3)]
+        for product in self.products:
+            Image.objects.create(product=product, image='images/galaxy.png', main=True)
+            property_type = PropertyType.objects.create(title='Ekran', product=product)
+            Property.objects.create(title='Diagonal', value='6.5', property_type=property_type)
+            CartItem.objects.create(user=self.user, product=product, amount=1)
+            VersusItem.objects.create(user=self.user, product=product)
+        self.addCleanup(popularity.flush)
+
+    def test_cart_and_versus_render_cards_from_cache(self):
+        cold = self.client.get('/cart-items/')
+        self.client.get('/versus-items/')
+        # Ikkinchi marta rasm va xususiyatlar uchun so'rov yo'q
+        with self.assertNumQueries(2):
+            warm = self.client.get('/cart-items/')
+        with self.assertNumQueries(1):
+            versus = self.client.get('/versus-items/')
+
+        self.assertEqual(warm.data, cold.data)
+        self.assertTrue(warm.data['results'][0]['product_image'].endswith('/media/images/galaxy.png'))
+        item = versus.data['Telefonlar'][0]
+        self.assertEqual(item['product_properties'], [{'type': 'Diagonal', 'value': '6.5'}])
+
+    def test_product_list_renders_cards_from_cache(self):
+        LikedItem.objects.create(user=self.user, product=self.products[0])
+        response = self.client.get('/products/')
+        # Kartochka fragmentlari cache'da: faqat count va mahsulotlar (flaglar bilan)
+        bump_version('catalog')
+        with self.assertNumQueries(2):
+            again = self.client.get('/products/')
+        self.assertEqual(again.data, response.data)
+        self.assertEqual(list(again.data['results'][0]), ProductSerializer.Meta.fields)
+        liked = {product['id']: product['like'] for product in again.data['results']}
+        self.assertEqual(liked, {product.id: product == self.products[0] for product in self.products})
+
+    def test_product_changes_refresh_only_their_card(self):
+        self.client.get('/cart-items/')
+        product = self.products[0]
+        Image.objects.filter(product=product).update(main=False)
+        Image.objects.create(product=product, image='images/new.png', main=True)
+        product.category.name = 'Smartfonlar'
+        product.category.save()
+
+        data = {item['product']: item for item in self.client.get('/versus-items/').data['Smartfonlar']}
+        self.assertTrue(data[product.id]['product_image'].endswith('/media/images/new.png'))
+
+
+class BulkPriceTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='secret', isadmin=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.product = create_product(price=200, monthly_price=20)
+        self.other = create_product(price=100)
+        self.same_brand = create_product(price=50, brand=self.product.brand, category=self.product.category)
+
+    def post(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/products/bulk-price/', data, format='json')
+
+    def test_discount_by_brand_is_one_update(self):
+        catalog, page = get_version('catalog'), get_version(f'product:{self.product.id}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(operation='discount', percent=25, brand=self.product.brand_id)
+
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual([q['sql'][:6] for q in queries].count('UPDATE'), 1)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.discount_price, self.product.effective_price), (150, 150))
+        self.assertEqual(Product.objects.get(pk=self.same_brand.id).effective_price, 37.5)
+        self.assertEqual(Product.objects.get(pk=self.other.id).effective_price, 100)
+        self.assertNotEqual(get_version('catalog'), catalog)
+        self.assertNotEqual(get_version(f'product:{self.product.id}'), page)
+
+    def test_expired_discount_keeps_list_price(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        self.post(operation='discount', percent=10, until=yesterday.isoformat(), ids=[self.product.id])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.discount_price, self.product.effective_price), (180, 200))
+
+    def test_adjust_price_rescales_discount(self):
+        self.post(operation='discount', percent=50, ids=[self.product.id])
+        self.post(operation='adjust_price', percent=10, ids=[self.product.id, self.other.id])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.price, self.product.monthly_price), (220, 22))
+        self.assertEqual((self.product.discount_price, self.product.effective_price), (110, 110))
+        self.assertEqual(Product.objects.get(pk=self.other.id).effective_price, 110)
+
+        self.post(operation='clear_discount', ids=[self.product.id])
+        self.assertEqual(Product.objects.get(pk=self.product.id).effective_price, 220)
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self.post(operation='discount', percent=25).status_code, 400)
+        self.assertEqual(self.post(operation='discount', percent=120, ids=[1]).status_code, 400)
+        self.client.force_authenticate(User.objects.create_user(username='ali', password='secret'))
+        self.assertEqual(self.post(operation='clear_discount', ids=[self.product.id]).status_code, 403)
+
+    def test_admin_action(self):
+        self.admin.is_staff = self.admin.is_superuser = True
+        self.admin.save()
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/main/product/', {
+                'action': 'set_discount', 'index': 0, 'percent': '20', 'until': '',
+                '_selected_action': [self.product.id, self.other.id],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            sorted(Product.objects.values_list('effective_price', flat=True)), [50, 80, 160],
+        )
+
+
+@override_settings(REST_FRAMEWORK=dict(
+    settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'user_writes': '3/min', 'ip_writes': '100/min'},
+))
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttle_blocks.clear()
+        self.user = User.objects.create_user(username='ali', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.products = [create_product() for _ in range(5)]
+
+    def like(self, product):
+        return self.client.post('/liked-items/add/', {'product': product.id}, format='json')
+
+    def test_write_window_is_shared_and_resets(self):
+        self.assertEqual([self.like(p).status_code for p in self.products[:3]], [201, 201, 201])
+        response = self.like(self.products[3])
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        # Tugagan oyna jarayon ichida eslab qolinadi, cache'ga qaramaydi
+        with mock.patch('main.throttling.cache.incr', wraps=cache.incr) as cache_incr:
+            self.assertEqual(self.like(self.products[3]).status_code, 429)
+        self.assertFalse([c for c in cache_incr.call_args_list if c.args[0].startswith('throttle:user_writes:')])
+        self.assertEqual(self.client.get('/liked-items/').status_code, 200)
+
+        throttle_blocks.clear()
+        with mock.patch('main.throttling.time.time', return_value=time.time() + 60):
+            self.assertEqual(self.like(self.products[3]).status_code, 201)
+
+    def test_other_users_keep_their_budget(self):
+        for product in self.products[:4]:
+            self.like(product)
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='vali', password='secret'))
+        self.assertEqual(other.post('/liked-items/add/', {'product': self.products[0].id}, format='json').status_code, 201)
+
+
+@override_settings(REST_FRAMEWORK=dict(
+    settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'user_writes': '3/min', 'ip_writes': '100/min'},
+))
+class ConcurrentThrottleTests(TransactionTestCase):
+    capacity = 3
+    extra = 4
+
+    def test_concurrent_writes_cannot_overrun_the_limit(self):
+        self.addCleanup(popularity.flush)
+        cache.clear()
+        throttle_blocks.clear()
+        user = User.objects.create_user(username='ali', password='secret')
+        products = [create_product() for _ in range(self.capacity + self.extra)]
+        # Oyna chegarasiga tushib qolmaslik uchun vaqt daqiqa boshiga qotiriladi
+        now = (time.time() // 60 + 1) * 60
+
+        barrier = threading.Barrier(len(products))
+        statuses = []
+
+        def like(product):
+            try:
+                client = APIClient()
+                client.force_authenticate(user)
+                barrier.wait()
+                statuses.append(client.post('/liked-items/add/', {'product': product.id}, format='json').status_code)
+            finally:
+                connection.close()
+
+        with mock.patch('main.throttling.time.time', return_value=now):
+            threads = [threading.Thread(target=like, args=(product,)) for product in products]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(statuses.count(201), self.capacity)
+        self.assertEqual(statuses.count(429), self.extra)
+
+
+class ConcurrencyLimitTests(TestCase):
+    @override_settings(CONCURRENCY_LIMIT=dict(settings.CONCURRENCY_LIMIT, MAX_IN_FLIGHT=0, QUEUE_TIMEOUT=0.01))
+    def test_overload_returns_503_with_retry_after(self):
+        response = Client().get('/categories/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Client().get('/messages/poll/', {'timeout': 0}).status_code, 401)
+
+
+class WarmCacheTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(popularity.flush)
+        self.products = [create_product(name=f'Galaxy {i}') for i in range(2)]
+
+    def test_hot_responses_are_served_from_cache(self):
+        out = StringIO()
+        call_command('warm_cache', workers=4, host='shop.example.com', local=True, stdout=out)
+        self.assertIn('Warmed 10 of 10', out.getvalue())
+
+        category = self.products[0].category_id
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/navigation/', HTTP_HOST='shop.example.com').status_code, 200)
+            response = self.client.get('/products/', {'category': category}, HTTP_HOST='shop.example.com')
+            self.assertEqual(response.status_code, 200)
+
+        # Warmup so'rovlari ko'rishlar hisobiga qo'shilmaydi
+        popularity.flush()
+        self.assertEqual(Product.objects.filter(views__gt=0).count(), 0)
+
+    def test_time_budget_skips_remaining_urls(self):
+        out = StringIO()
+        call_command('warm_cache', time_budget=0, host='shop.example.com', local=True, stdout=out)
+        self.assertIn('10 skipped', out.getvalue())
+
+    def test_refuses_without_host_or_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, 'CACHE_WARMUP_HOST'):
+            call_command('warm_cache', host=None, local=True)
+        with self.assertRaisesMessage(CommandError, 'per-process'):
+            call_command('warm_cache', host='shop.example.com')
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 20
+    stock = 7
+
+    def test_concurrent_checkouts_never_oversell(self):
+        self.addCleanup(popularity.flush)
+        # Hamma xaridor bitta IP'dan keladi: oldingi testlar to'ldirgan WindowThrottle oynasini va blokni tozalaymiz
+        cache.clear()
+        throttle_blocks.clear()
+        product = create_product(stock=self.stock)
+        carts = []
+        for i in range(self.buyers):
+            user = User.objects.create_user(username=f'buyer{i}', password='secret')
+            carts.append((user, CartItem.objects.create(user=user, product=product, amount=1)))
+
+        barrier = threading.Barrier(self.buyers)
+        statuses = []
+
+        def buy(user, item):
+            try:
+                barrier.wait()
+                statuses.append(checkout(user, [item]).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=cart) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(statuses.count(201), self.stock)
+        self.assertEqual(statuses.count(400), self.buyers - self.stock)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), self.stock)
+
+
+# Har bir route uchun so'rovlar chegarasi: route'ning o'z metodi va (anonim, oddiy user, admin).
+# Sahifa 5 tadan 50 tagacha kattalashganda soni o'zgarmasligi ham tekshiriladi.
+QUERY_BUDGETS = {
+    '': ('GET', (0, 0, 0)),
+    'docs/': ('GET', (0, 1, 1)),
+    'openapi.json': ('GET', (0, 0, 0)),
+    'users/': ('GET', (0, 3, 3)),
+    'users/me': ('GET', (0, 2, 2)),
+    'users/register': ('POST', (4, 5, 5)),
+    'brands/': ('GET', (2, 2, 2)),
+    'brands/create': ('POST', (0, 1, 3)),
+    'brands/<int:pk>/': ('GET', (1, 2, 3)),
+    'categories/': ('GET', (2, 2, 2)),
+    'categories/create': ('POST', (0, 1, 2)),
+    'categories/<int:pk>/': ('GET', (1, 2, 3)),
+    'navigation/': ('GET', (2, 2, 2)),
+    'suggestions/': ('GET', (0, 0, 0)),
+    'products/': ('GET', (5, 5, 5)),
+    'products/filter/': ('POST', (4, 4, 4)),
+    'products/create/': ('POST', (0, 1, 11)),
+    'products/bulk-price/': ('POST', (0, 1, 4)),
+    'products/<int:pk>/': ('GET', (1, 2, 6)),
+    'products/<int:pk>/page/': ('GET', (9, 9, 9)),
+    'products/<int:pk>/recommendations/': ('GET', (3, 3, 3)),
+    'images/': ('GET', (2, 2, 2)),
+    'images/craete': ('POST', (0, 1, 3)),
+    'images/<int:pk>/': ('GET', (1, 2, 3)),
+    'cart-items/': ('GET', (0, 7, 7)),
+    'cart-items/create': ('POST', (0, 6, 6)),
+    'cart-items/<int:pk>/': ('GET', (1, 5, 3)),
+    'orders/': ('GET', (0, 3, 3)),
+    'orders/create': ('POST', (0, 10, 10)),
+    'orders/<int:pk>/': ('GET', (1, 3, 3)),
+    'order-items/': ('GET', (0, 2, 2)),
+    'order-items/create/': ('POST', (0, 4, 4)),
+    'order-items/<int:pk>/': ('GET', (1, 4, 3)),
+    'liked-items/': ('GET', (0, 7, 7)),
+    'liked-items/add/': ('POST', (0, 6, 6)),
+    'liked-items/<int:pk>/': ('GET', (1, 3, 3)),
+    'versus-items/': ('GET', (0, 5, 5)),
+    'versus-items/add/': ('POST', (0, 7, 7)),
+    'versus-items/<int:pk>/': ('GET', (1, 6, 3)),
+    'messages/': ('GET', (0, 2, 2)),
+    'messages/create/': ('POST', (0, 3, 3)),
+    'messages/poll/': ('GET', (0, 2, 2)),
+    'messages/stream/': ('GET', (0, 1, 1)),
+    'messages/<int:pk>/': ('GET', (1, 3, 3)),
+    'uploads/': ('POST', (0, 2, 2)),
+    'uploads/<uuid:pk>/': ('GET', (1, 3, 3)),
+    'uploads/<uuid:pk>/finalize/': ('POST', (1, 3, 3)),
+    'property-types/': ('GET', (2, 3, 3)),
+    'property-types/<int:pk>/': ('GET', (3, 4, 4)),
+    'properties/': ('GET', (1, 2, 2)),
+    'properties/<int:pk>/': ('GET', (2, 3, 3)),
+    'galary/': ('GET', (2, 2, 2)),
+    'galary/<int:pk>/': ('GET', (2, 2, 2)),
+    'galary/create': ('POST', (0, 1, 2)),
+    'token/': ('POST', (1, 1, 1)),
+    'token/refresh/': ('POST', (1, 1, 1)),
+}
+
+# Detail route'lardagi pk qaysi modeldan olinadi (birinchi yozuv, oddiy userga tegishli)
+ROUTE_MODELS = {
+    'brands': Brand, 'categories': Category, 'products': Product, 'images': Image,
+    'cart-items': CartItem, 'orders': Order, 'order-items': OrderItem, 'liked-items': LikedItem,
+    'versus-items': VersusItem, 'messages': Message, 'uploads': Upload, 'property-types': PropertyType,
+    'properties': Property, 'galary': Galary,
+}
+
+def first_pk(model, **filters):
+    return model.objects.filter(**filters).order_by('pk').values_list('pk', flat=True).first()
+
+
+# GET uchun query parametrlari, qolganlari uchun eng kichik to'g'ri body. Funksiya bo'lsa (test, user) bilan
+# o'lchovdan oldin chaqiriladi: har safar yangi yozuv kerak bo'lgan route'lar uchun
+ROUTE_DATA = {
+    'messages/poll/': {'timeout': 0},
+    'users/register': lambda test, user: {'username': f'yangi{User.objects.count()}', 'password': 'secret123'},
+    'brands/create': lambda test, user: {'name': 'Brend', 'category': first_pk(Category)},
+    'categories/create': {'name': 'Kategoriya'},
+    'products/filter/': {},
+    'products/create/': lambda test, user: {
+        'name': 'Yangi', 'details': '-', 'price': 100, 'monthly_price': 10, 'country': 'UZ',
+        'brand': first_pk(Brand), 'category': first_pk(Category),
+    },
+    'products/bulk-price/': lambda test, user: {'operation': 'discount', 'percent': 10, 'category': first_pk(Category)},
+    'images/craete': lambda test, user: {'product': first_pk(Product)},
+    'cart-items/create': lambda test, user: {'product': first_pk(Product), 'amount': 1},
+    'orders/create': lambda test, user: dict(
+        CHECKOUT_DATA, cart_item_ids=[first_pk(CartItem, user=user or test.user)],
+    ),
+    'order-items/create/': lambda test, user: {
+        'order': first_pk(Order, user=user or test.user), 'product': first_pk(Product), 'amount': 1,
+    },
+    'liked-items/add/': lambda test, user: {'product': create_product(name='Yangi').pk},
+    'versus-items/add/': lambda test, user: {'product': create_product(name='Yangi').pk},
+    'messages/create/': lambda test, user: {'message': 'salom', 'user': (user or test.user).pk},
+    'uploads/': {'target': 'message', 'filename': 'salom.txt', 'size': 10},
+    'uploads/<uuid:pk>/finalize/': {'message': 'salom'},
+    'galary/create': {},
+    'token/': {'username': 'ali', 'password': 'secret'},
+    'token/refresh/': lambda test, user: {'refresh': str(RefreshToken.for_user(user or test.user))},
+}
+
+
+# Ko'rishlar hisoblagichi o'lchov ichida flush qilinmasin, chiqishda bir marta yoziladi
+@override_settings(POPULARITY_COUNTERS=dict(settings.POPULARITY_COUNTERS, FLUSH_INTERVAL=3600, MAX_PENDING=10 ** 6))
+class QueryBudgetTests(TemporaryMediaMixin, TestCase):
+    sizes = (5, 50)
+
+    def setUp(self):
+        super().setUp()
+        popularity.flush()
+        self.addCleanup(popularity.flush)
+        self.user = User.objects.create_user(username='ali', password='secret')
+        self.admin = User.objects.create_user(username='admin', password='secret', isadmin=True)
+        self.roles = {'anon': None, 'user': self.user, 'admin': self.admin}
+        self.seeded = 0
+
+    def auth(self, user):
+        token = TokenObtainPairWithClaimsSerializer.get_token(user).access_token
+        return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def seed(self, total):
+        for i in range(self.seeded, total):
+            category = Category.objects.create(name=f'Kategoriya {i}')
+            brand = Brand.objects.create(name=f'Brend {i}', category=category)
+            product = Product.objects.create(
+                name=f'Galaxy {i}', details='-', price=100 + i, monthly_price=10, country='UZ',
+                brand=brand, category=category, galary=Galary.objects.create(image='images/galary.png'),
+            )
+            Image.objects.create(product=product, image='images/galaxy.png', main=True)
+            property_type = PropertyType.objects.create(title='Ekran', product=product)
+            Property.objects.create(title='Diagonal', value='6.5', property_type=property_type)
+            if i:
+                ProductNeighbor.objects.create(product_id=Product.objects.order_by('pk')[0].pk, neighbor=product,
+                                               kind='similar', score=1 / i)
+            for user in (self.user, self.admin):
+                CartItem.objects.create(user=user, product=product, amount=1)
+                LikedItem.objects.create(user=user, product=product)
+                VersusItem.objects.create(user=user, product=product, category=category)
+                order = Order.objects.create(user=user, total_price=100, region='Toshkent', city='Toshkent',
+                                             **CHECKOUT_DATA)
+                OrderItem.objects.create(order=order, product=product, amount=1)
+                Message.objects.create(user=user, message=f'salom {i}')
+                Upload.objects.create(user=user, target='message', filename=f'{i}.txt', size=10)
+        self.seeded = total
+
+    def routes(self):
+        from core.urls import urlpatterns
+        for pattern in urlpatterns:
+            route = str(pattern.pattern)
+            # admin sahifalari AdminQueryTests'da tekshiriladi, media fayllar faqat DEBUG'da
+            if not route.startswith(('admin/', '^')):
+                yield route
+
+    def url(self, route):
+        if '<' not in route:
+            return f'/{route}'
+        model = ROUTE_MODELS[route.split('/')[0]]
+        # uuid pk'lar tartibsiz: user maydoni bo'lsa birinchi yozuv oddiy userdan olinadi
+        filters = {'user': self.user} if any(field.name == 'user' for field in model._meta.fields) else {}
+        pk = first_pk(model, **filters)
+        return '/' + re.sub(r'<\w+:pk>', str(pk), route)
+
+    def capture(self, route, user):
+        method, _ = QUERY_BUDGETS[route]
+        data = ROUTE_DATA.get(route, {})
+        if callable(data):
+            data = data(self, user)
+        auth = self.auth(user) if user else {}
+        # Har bir so'rov sovuq cache bilan o'lchanadi
+        cache.clear()
+        local_users.clear()
+        local_fragments.clear()
+        throttle_blocks.clear()
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'GET':
+                data = {'page_size': self.sizes[-1], **data}
+            getattr(self.client, method.lower())(self.url(route), data, **auth)
+        return queries.captured_queries
+
+    def test_every_route_within_budget(self):
+        routes = list(self.routes())
+        self.assertEqual(sorted(set(routes) - QUERY_BUDGETS.keys()), [], "Yangi route uchun QUERY_BUDGETS'ga chegara qo'shing")
+
+        self.seed(self.sizes[0])
+        for route in routes:
+            for user in self.roles.values():
+                self.capture(route, user)
+        small = {(route, role): len(self.capture(route, user)) for route in routes for role, user in self.roles.items()}
+
+        self.seed(self.sizes[1])
+        failures = []
+        for route in routes:
+            method, budgets = QUERY_BUDGETS[route]
+            for budget, (role, user) in zip(budgets, self.roles.items()):
+                queries = self.capture(route, user)
+                if len(queries) > budget or len(queries) != small[route, role]:
+                    sql = '\n'.join(f'    {query["sql"]}' for query in queries)
+                    failures.append(f'{role} {method} /{route}: {small[route, role]} -> {len(queries)} (budget {budget})\n{sql}')
+        if failures:
+            self.fail('\n\n'.join(failures))
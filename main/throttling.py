@@ -0,0 +1,83 @@
+import time
+
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .cache import LocalLRUCache
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Limiti tugagan kalitlar: oyna tugaguncha shu jarayonda cache'ga murojaat qilinmaydi
+blocked = LocalLRUCache(maxsize=4096, timeout=60)
+
+
+class WindowThrottle(BaseThrottle):
+    """
+    Fixed-window counter over the shared cache for unsafe methods. A rate
+    such as ``'60/min'`` in ``DEFAULT_THROTTLE_RATES[scope]`` allows 60
+    writes per clock minute. The counter is taken with ``cache.add`` and
+    ``cache.incr``, so concurrent requests each get a distinct count. Once a
+    window is used up the process remembers when it ends and rejects further
+    requests without a cache round trip.
+    """
+    scope = None
+
+    def __init__(self):
+        count, _, period = api_settings.DEFAULT_THROTTLE_RATES[self.scope].partition('/')
+        self.capacity = int(count)
+        self.period = PERIODS[period[0]]
+        self.wait_seconds = None
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        now = time.time()
+        blocked_until = blocked.get(key)
+        if blocked_until is not None and blocked_until > now:
+            self.wait_seconds = blocked_until - now
+            return False
+
+        window = int(now // self.period)
+        window_key = f'{key}:{window}'
+        if cache.add(window_key, 1, self.period + 1):
+            count = 1
+        else:
+            try:
+                count = cache.incr(window_key)
+            except ValueError:
+                # add va incr orasida kalit muddati tugadi
+                count = 1 if cache.add(window_key, 1, self.period + 1) else cache.incr(window_key)
+        if count > self.capacity:
+            reset = (window + 1) * self.period
+            self.wait_seconds = reset - now
+            blocked.set(key, reset, timeout=self.wait_seconds)
+            return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserWriteThrottle(WindowThrottle):
+    scope = 'user_writes'
+
+    def get_cache_key(self, request, view):
+        if not request.user.is_authenticated:
+            return None
+        return f'throttle:{self.scope}:{request.user.pk}'
+
+
+class IPWriteThrottle(WindowThrottle):
+    scope = 'ip_writes'
+
+    def get_cache_key(self, request, view):
+        return f'throttle:{self.scope}:{self.get_ident(request)}'
@@ -0,0 +1,138 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import LocalLRUCache
+from .models import Upload
+
+BLOCK_SIZE = 64 * 1024
+
+# Keyingi bo'lak odatda shu jarayonga keladi: hash holatini offset bo'yicha saqlab qo'yamiz
+hashers = LocalLRUCache(maxsize=256, timeout=settings.CHUNKED_UPLOADS['EXPIRES'].total_seconds())
+
+
+class UploadConflict(Exception):
+    """The chunk does not start at the session's current offset."""
+
+
+class UploadInterrupted(Exception):
+    """The client sent fewer bytes than announced."""
+
+
+def part_path(upload):
+    return os.path.join(settings.CHUNKED_UPLOADS['TEMP_DIR'], f'{upload.pk}.part')
+
+
+def start_upload(upload):
+    os.makedirs(settings.CHUNKED_UPLOADS['TEMP_DIR'], exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    hashers.set(f'{upload.pk}:0', hashlib.sha256())
+
+
+def upload_hasher(upload, offset):
+    hasher = hashers.get(f'{upload.pk}:{offset}')
+    if hasher is not None:
+        return hasher.copy()
+
+    # Yuklash boshqa jarayonda davom etgan: diskdagi qismni bir marta o'qib hashni tiklaymiz
+    hasher = hashlib.sha256()
+    with open(part_path(upload), 'rb') as part:
+        remaining = offset
+        while remaining:
+            block = part.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def write_chunk(upload, start, length, stream):
+    """
+    Streams ``length`` bytes from ``stream`` into the part file at ``start``
+    and returns the new offset. The range is claimed with a conditional
+    UPDATE of ``writing_until`` first, so two clients cannot write the same
+    chunk. ``offset`` moves only once the bytes are fsynced; a writer that
+    dies mid-chunk leaves it at ``start`` and its claim lapses after
+    ``CHUNK_TIMEOUT``.
+    """
+    end = start + length
+    now = timezone.now()
+    claim = now + settings.CHUNKED_UPLOADS['CHUNK_TIMEOUT']
+    claimed = Upload.objects.filter(
+        Q(writing_until__isnull=True) | Q(writing_until__lt=now), pk=upload.pk, offset=start,
+    ).update(writing_until=claim)
+    if not claimed:
+        raise UploadConflict
+
+    try:
+        hasher = upload_hasher(upload, start)
+        with open(part_path(upload), 'r+b') as part:
+            part.seek(start)
+            part.truncate()
+            remaining = length
+            while remaining:
+                block = stream.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    raise UploadInterrupted
+                part.write(block)
+                hasher.update(block)
+                remaining -= len(block)
+            part.flush()
+            os.fsync(part.fileno())
+    except BaseException:
+        Upload.objects.filter(pk=upload.pk, writing_until=claim).update(writing_until=None)
+        raise
+
+    # Claim muddati o'tib, bo'lakni boshqa so'rov olgan bo'lsa offset'ni u suradi
+    if not Upload.objects.filter(pk=upload.pk, offset=start, writing_until=claim).update(offset=end, writing_until=None):
+        raise UploadConflict
+
+    hashers.set(f'{upload.pk}:{end}', hasher)
+    upload.offset = end
+    return end
+
+
+def attach_upload(upload, instance, field_name):
+    """
+    Moves the finished part file into ``instance.<field_name>``'s storage
+    without copying it and saves ``instance``. Returns the file's sha256.
+    The file is moved last, after the row is saved, so a failed save leaves
+    the upload intact and ready to be finalized again.
+    """
+    field = instance._meta.get_field(field_name)
+    digest = upload_hasher(upload, upload.size).hexdigest()
+
+    with transaction.atomic():
+        if not Upload.objects.filter(pk=upload.pk, offset=upload.size).delete()[0]:
+            raise UploadConflict
+        if hasattr(field.storage, 'adopt'):
+            name = field.storage.blob_name(digest, upload.filename)
+        else:
+            name = field.storage.get_available_name(
+                field.generate_filename(instance, upload.filename), max_length=field.max_length,
+            )
+        setattr(instance, field_name, name)
+        instance.save()
+
+        if hasattr(field.storage, 'adopt'):
+            field.storage.adopt(part_path(upload), upload.filename, digest)
+        else:
+            path = field.storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(part_path(upload), path)
+
+    hashers.delete(f'{upload.pk}:{upload.size}')
+    return digest
+
+
+def discard_upload(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
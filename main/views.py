@@ -1,8 +1,18 @@
+import json
+import time
 from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.exceptions import APIException, AuthenticationFailed, PermissionDenied, ValidationError
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.generics import get_object_or_404, GenericAPIView
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -10,8 +20,89 @@ from rest_framework.views import APIView
 from rest_framework import generics
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny, SAFE_METHODS
+from core.routers import use_replica_for
+from .authentication import CachedJWTAuthentication, JWTClaimsAuthentication
+from .cache import catalog_cache_key, product_cache_key, recommendations_cache_key
+from .counters import popularity
 from .serializers import *
-from .pagination import CustomPageNumberPagination
+from .inventory import release_cart_item
+from .middleware import precompress
+from .filters import ProductFilter
+from .pagination import CustomPageNumberPagination, MessageCursorPagination
+from .streams import wait_for_messages
+from .suggestions import suggestions
+from .throttling import IPWriteThrottle, UserWriteThrottle
+from .uploads import UploadConflict, UploadInterrupted, attach_upload, discard_upload, start_upload, write_chunk
+
+
+class ReplicaReadMixin:
+    replica_methods = SAFE_METHODS
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in self.replica_methods:
+            use_replica_for(request)
+
+
+class CatalogCacheMixin:
+    """
+    Serves GET responses from the shared cache, keyed by the absolute URL
+    (scheme, host and full path) and the catalog version. The rendered JSON
+    is stored together with its compressed variants. Requests with a token
+    are cached only when none of ``user_fields`` are rendered, and the token
+    is still checked before a cached body is served.
+    """
+    user_fields = set()
+
+    def get_cache_key(self, request):
+        return catalog_cache_key(request.build_absolute_uri())
+
+    def is_cacheable(self, request):
+        if request.method != 'GET' or 'text/html' in request.META.get('HTTP_ACCEPT', ''):
+            return False
+        if 'HTTP_AUTHORIZATION' not in request.META or not self.user_fields:
+            return True
+        fields = parse_csv(request.GET.get('fields'))
+        return bool(fields) and not fields & self.user_fields
+
+    def has_valid_credentials(self, request):
+        if 'HTTP_AUTHORIZATION' not in request.META:
+            return True
+        try:
+            self.initialize_request(request).user
+        except APIException:
+            return False
+        return True
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        # Yaroqsiz token cache holatidan qat'i nazar DRF'ning o'zidan 401 oladi
+        if entry is not None and self.has_valid_credentials(request):
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            for header, value in entry['headers'].items():
+                response[header] = value
+            response.precompressed = entry['encodings']
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+
+        response.render()
+        content_type = response.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            response.precompressed = precompress(response.content, content_type)
+            cache.set(key, {
+                'content': response.content,
+                'content_type': content_type,
+                'headers': {header: response[header] for header in ('Vary', 'Allow') if response.has_header(header)},
+                'encodings': response.precompressed,
+            }, settings.CATALOG_CACHE_TIMEOUT)
+        return response
 
 
 class RegisterAPIView(generics.CreateAPIView):
@@ -33,12 +124,14 @@ class UserRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        # request.user faqat cache'dagi maydonlarga ega, profil to'liq o'qiladi
+        return User.objects.get(pk=self.request.user.pk)
 
 
-class BrandListAPIView(generics.ListAPIView):
+class BrandListAPIView(CatalogCacheMixin, ReplicaReadMixin, generics.ListAPIView):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
+    authentication_classes = [JWTClaimsAuthentication]
     permission_classes = [AllowAny]
     pagination_class = CustomPageNumberPagination
     filter_backends = [DjangoFilterBackend, SearchFilter,OrderingFilter,]
@@ -60,6 +153,11 @@ class BrandListAPIView(generics.ListAPIView):
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+    def get_queryset(self):
+        if 'category' in parse_csv(self.request.query_params.get('expand')):
+            return Brand.objects.select_related('category')
+        return Brand.objects.all()
+
 
 
 class BrandCreateAPIView(generics.CreateAPIView):
@@ -75,18 +173,57 @@ class BrandDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAdmin]
 
 
-class CategoryListAPIView(generics.ListAPIView):
+class CategoryListAPIView(CatalogCacheMixin, ReplicaReadMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    authentication_classes = [JWTClaimsAuthentication]
     permission_classes = [AllowAny]
     pagination_class = CustomPageNumberPagination
     filter_backends = [DjangoFilterBackend , SearchFilter, OrderingFilter]
-    filterset_fields = ['name','brand']
+    filterset_fields = ['name']
     search_fields = ['name']
-    ordering_fields = ['created_at', 'price']
+    ordering_fields = ['id', 'name']
     parser_classes = [MultiPartParser, FormParser]
 
 
+class SuggestionView(View):
+    """
+    Search-as-you-type: ``GET /suggestions/?q=gal&limit=10`` returns the most
+    popular products, brands and categories with a word starting with ``q``.
+    Served from the in-process ``main.suggestions`` index, no query per keystroke.
+    """
+
+    def get(self, request):
+        options = settings.SUGGESTIONS
+        try:
+            limit = min(max(int(request.GET.get('limit', options['LIMIT'])), 0), options['MAX_LIMIT'])
+        except ValueError:
+            return JsonResponse({'limit': "Butun son bo'lishi kerak."}, status=400)
+        query = request.GET.get('q', '')
+        return JsonResponse({'query': query, 'results': suggestions.search(query, limit)})
+
+
+class NavigationAPIView(CatalogCacheMixin, ReplicaReadMixin, generics.ListAPIView):
+    """
+    Storefront menu: every category with its brands and product counts, in
+    two grouped queries. Cached under the catalog version, so any Category,
+    Brand or Product change rebuilds it.
+    """
+    serializer_class = NavigationCategorySerializer
+    authentication_classes = [JWTClaimsAuthentication]
+    permission_classes = [AllowAny]
+    pagination_class = None
+
+    def get_queryset(self):
+        brands = Brand.objects.annotate(
+            product_count=Count('product', filter=Q(product__category_id=F('category_id'))),
+        ).order_by('name')
+        return (
+            Category.objects.annotate(product_count=Count('product'))
+            .prefetch_related(Prefetch('brand_set', queryset=brands)).order_by('name')
+        )
+
+
 class CategoryCreateAPIView(generics.CreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -97,15 +234,17 @@ class CategoryRetrieveUpdateAPIView(generics.RetrieveUpdateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdmin]
-class ProductListAPIView(generics.ListAPIView):
+class ProductListAPIView(CatalogCacheMixin, ReplicaReadMixin, generics.ListAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    authentication_classes = [JWTClaimsAuthentication]
     permission_classes = [AllowAny]
     pagination_class = CustomPageNumberPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['brand', 'category' ,'galary']
+    filterset_class = ProductFilter
+    user_fields = {'like', 'like_id', 'is_cart', 'versus'}
     search_fields = ['name', 'brand__name']
-    ordering_fields = ['created_at', 'price']
+    ordering_fields = ['created_at', 'price', 'effective_price', 'likes', 'orders', 'views', 'cart_adds']
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -115,37 +254,104 @@ class ProductListAPIView(generics.ListAPIView):
                 type=openapi.TYPE_STRING,
                 description='Brand id filter',
             ),
+            openapi.Parameter(
+                name='brand__in',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description='Comma separated brand ids, e.g. 1,2,3',
+            ),
             openapi.Parameter(
                 name='category',
                 in_=openapi.IN_QUERY,
                 type=openapi.TYPE_INTEGER,
                 description='Category id filter',
             ),
+            openapi.Parameter(
+                name='category__in',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description='Comma separated category ids, e.g. 1,2,3',
+            ),
             openapi.Parameter(
                 name='galary',
                 in_=openapi.IN_QUERY,
                 type=openapi.TYPE_STRING,
                 description='Galary id filter',
 
-            )
+            ),
+            openapi.Parameter(
+                name='price_min',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_NUMBER,
+                description='Minimum list price',
+            ),
+            openapi.Parameter(
+                name='price_max',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_NUMBER,
+                description='Maximum list price',
+            ),
+            openapi.Parameter(
+                name='effective_price_min',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_NUMBER,
+                description='Minimum selling price (discount applied)',
+            ),
+            openapi.Parameter(
+                name='effective_price_max',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_NUMBER,
+                description='Maximum selling price (discount applied)',
+            ),
+            openapi.Parameter(
+                name='is_cash',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_BOOLEAN,
+                description='Cash payment filter',
+            ),
+            openapi.Parameter(
+                name='discount_active',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_BOOLEAN,
+                description='Only products with a running discount',
+            ),
+            openapi.Parameter(
+                name='fields',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description='Comma separated fields to return, e.g. id,name,price,main_image',
+            ),
+            openapi.Parameter(
+                name='expand',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description='Nested objects instead of ids: brand, category',
+            ),
         ]
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
-class FilterProductAPIView(APIView):
+    def get_queryset(self):
+        fields = self.get_serializer().fields
+        return ProductSerializer.setup_queryset(Product.objects.all(), fields, self.request.user, cached=True)
+
+class FilterProductAPIView(ReplicaReadMixin, APIView):
+    authentication_classes = [JWTClaimsAuthentication]
+    replica_methods = ('POST',)
+
     def filter_products(self, products, filters):
         min_price = filters.get("minPrice")
         if min_price:
             try:
-                products = products.filter(price__gte=float(min_price))
+                products = products.filter(effective_price__gte=float(min_price))
             except ValueError:
                 pass
 
         max_price = filters.get("maxPrice")
         if max_price:
             try:
-                products = products.filter(price__lte=float(max_price))
+                products = products.filter(effective_price__lte=float(max_price))
             except ValueError:
                 pass
 
@@ -170,9 +376,11 @@ class FilterProductAPIView(APIView):
         return products
 
     def post(self, request):
-        products = Product.objects.all()
+        context = {'request': request, 'view': self}
+        fields = ProductSerializer(context=context).fields
+        products = ProductSerializer.setup_queryset(Product.objects.all(), fields, request.user, cached=True)
         filtered_products = self.filter_products(products, request.data)
-        serializer = ProductSerializer(filtered_products, many=True, context={'request': request})
+        serializer = ProductSerializer(filtered_products, many=True, context=context)
         return Response({"products": serializer.data}, status=status.HTTP_200_OK)
 
 
@@ -190,10 +398,25 @@ class ProductCreateAPIView(generics.CreateAPIView):
         serializer.save()
 
 
+class ProductBulkPriceAPIView(generics.GenericAPIView):
+    """One UPDATE per request instead of a save per product; see ``BulkPriceSerializer``."""
+    serializer_class = BulkPriceSerializer
+    permission_classes = [IsAdmin]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'updated': serializer.apply()}, status=status.HTTP_200_OK)
+
+
 class ProductRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
 
+    def get_queryset(self):
+        fields = self.get_serializer().fields
+        return ProductSerializer.setup_queryset(Product.objects.all(), fields, self.request.user)
+
     def get_permissions(self):
         if self.request.method in SAFE_METHODS:
             return [IsAdmin()]
@@ -210,9 +433,69 @@ class ProductRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView)
             raise PermissionDenied(detail="You are not the owner of this product")
         instance.delete()
 
-class GalaryListAPIView(generics.ListAPIView):
+class ProductPageAPIView(CatalogCacheMixin, ReplicaReadMixin, generics.RetrieveAPIView):
+    """
+    Public product page in one response: the product with its images, grouped
+    specs, brand, category, gallery and a few products from the same category.
+    Runs a fixed number of queries and is cached per product version; brand,
+    category and related cards may lag by up to CATALOG_CACHE_TIMEOUT.
+    """
+    serializer_class = ProductPageSerializer
+    authentication_classes = [JWTClaimsAuthentication]
+    permission_classes = [AllowAny]
+    related_limit = 8
+
+    def dispatch(self, request, *args, **kwargs):
+        # Ko'rishlar cache'dan qaytgan javoblar uchun ham hisoblanadi (warm_cache so'rovlaridan tashqari)
+        if request.method == 'GET' and not getattr(request, 'cache_warmup', False):
+            popularity.add(kwargs['pk'], 'views')
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        return product_cache_key(self.kwargs['pk'], request.build_absolute_uri())
+
+    def get_queryset(self):
+        return ProductPageSerializer.setup_queryset(Product.objects.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        product = self.get_object()
+        related = (
+            Product.objects.filter(category_id=product.category_id).exclude(pk=product.pk)
+            .prefetch_related('image_set').order_by('-id')[:self.related_limit]
+        )
+        serializer = self.get_serializer(product, context=dict(self.get_serializer_context(), related=related))
+        return Response(serializer.data)
+
+
+class ProductRecommendationsAPIView(CatalogCacheMixin, ReplicaReadMixin, generics.ListAPIView):
+    """
+    ``?kind=similar`` (default) or ``?kind=bought_together`` neighbours of a
+    product, read from the table ``compute_recommendations`` fills.
+    """
+    serializer_class = ProductNeighborSerializer
+    authentication_classes = [JWTClaimsAuthentication]
+    permission_classes = [AllowAny]
+    pagination_class = None
+
+    def get_cache_key(self, request):
+        return recommendations_cache_key(request.build_absolute_uri())
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ProductNeighbor.objects.none()
+        kind = self.request.query_params.get('kind', 'similar')
+        if kind not in dict(ProductNeighbor.KIND_CHOICES):
+            raise ValidationError({'kind': f"Quyidagilardan biri bo'lishi kerak: {', '.join(dict(ProductNeighbor.KIND_CHOICES))}."})
+        return (
+            ProductNeighbor.objects.filter(product_id=self.kwargs['pk'], kind=kind)
+            .select_related('neighbor').prefetch_related('neighbor__image_set').order_by('-score', 'neighbor_id')
+        )
+
+
+class GalaryListAPIView(CatalogCacheMixin, ReplicaReadMixin, generics.ListAPIView):
     queryset = Galary.objects.all()
     serializer_class = GalarySerializer
+    authentication_classes = [JWTClaimsAuthentication]
     permission_classes = [AllowAny]
     parser_classes = [MultiPartParser, FormParser]
     pagination_class = CustomPageNumberPagination
@@ -223,17 +506,19 @@ class GalaryCreateAPIView(generics.CreateAPIView):
     permission_classes = [IsAdmin]
     parser_classes = [MultiPartParser, FormParser]
 
-class GalaryRetrieveAPIView(generics.RetrieveAPIView):
+class GalaryRetrieveAPIView(CatalogCacheMixin, ReplicaReadMixin, generics.RetrieveAPIView):
     serializer_class = GalarySerializer
+    authentication_classes = [JWTClaimsAuthentication]
     permission_classes = [AllowAny]
+    queryset = Galary.objects.all()
 
     def get_object(self):
-        queryset = Galary.objects.all()
-        return get_object_or_404(queryset, pk=self.kwargs['pk'])
+        return get_object_or_404(self.get_queryset(), pk=self.kwargs['pk'])
 
-class ImageListAPIView(generics.ListAPIView):
+class ImageListAPIView(CatalogCacheMixin, ReplicaReadMixin, generics.ListAPIView):
     queryset = Image.objects.all()
     serializer_class = ImageSerializer
+    authentication_classes = [JWTClaimsAuthentication]
     permission_classes = [AllowAny]
     pagination_class = CustomPageNumberPagination
     filter_backends = [SearchFilter, OrderingFilter]
@@ -274,13 +559,14 @@ class CartItemListAPIView(generics.ListAPIView):
     ordering_fields = ['created_at']
 
     def get_queryset(self):
-        return CartItem.objects.filter(user=self.request.user)
+        return CartItem.objects.filter(user=self.request.user).select_related('product')
 
 
 class CartItemCreateAPIView(generics.CreateAPIView):
     queryset = CartItem.objects.all()
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserWriteThrottle, IPWriteThrottle]
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -291,6 +577,8 @@ class CartItemDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return CartItem.objects.none()
         return CartItem.objects.filter(user=self.request.user)
 
     def perform_update(self, serializer):
@@ -302,7 +590,9 @@ class CartItemDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     def perform_destroy(self, instance):
         if instance.user != self.request.user:
             raise PermissionDenied("Siz faqat o'z cart item'laringizni o'chirishingiz mumkin.")
-        instance.delete()
+        with transaction.atomic():
+            release_cart_item(instance)
+            instance.delete()
 
 
 class OrderListAPIView(generics.ListAPIView):
@@ -321,6 +611,7 @@ class OrderCreateAPIView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
     queryset = Order.objects.all()
     serializer_class = OrderCreateSerializer
+    throttle_classes = [UserWriteThrottle, IPWriteThrottle]
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -330,6 +621,8 @@ class OrderDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = OrderSerializer
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Order.objects.none()
         return Order.objects.filter(user=self.request.user)
 
     def perform_update(self, serializer):
@@ -355,7 +648,7 @@ class OrderItemListAPIView(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
-            return OrderItem.objects.filter(order__user=user)
+            return OrderItem.objects.filter(order__user=user).select_related('product')
         return OrderItem.objects.none()
 
     def get(self, request, *args, **kwargs):
@@ -402,15 +695,24 @@ class LikedItemListAPIView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     pagination_class = CustomPageNumberPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    ordering_fields = ['created_at', 'price']
+    ordering_fields = ['id', 'product__price', 'product__name']
     search_fields = ['product__name']
 
     def get_queryset(self):
-        return LikedItem.objects.filter(user=self.request.user)
+        if not self.request.user.is_authenticated:
+            return LikedItem.objects.none()
+        # Kartochka qismi fragment cache'dan, savat/versus belgilari sahifaga bir martada yuklanadi
+        fields = {name: field for name, field in LikedProductSerializer().fields.items() if name not in ('like', 'like_id')}
+        products = ProductSerializer.setup_queryset(Product.objects.all(), fields, self.request.user, cached=True)
+        return (
+            LikedItem.objects.filter(user=self.request.user)
+            .prefetch_related(Prefetch('product', queryset=products)).order_by('-id')
+        )
 
 class ProductAddLikedApiView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = LikedItemSerializer
+    throttle_classes = [UserWriteThrottle, IPWriteThrottle]
 
     def post(self, request, *args, **kwargs):
         product_id = request.data.get('product')
@@ -489,13 +791,12 @@ class VersusItemListAPIView(APIView):
 
     def get(self, request):
         user = request.user
-        versus_items = VersusItem.objects.filter(user=user).select_related('product__category', 'product')
-        serializer = VersusItemSerializer(versus_items, many=True)
+        versus_items = list(VersusItem.objects.filter(user=user).select_related('product__category', 'product'))
+        serializer = VersusItemSerializer(versus_items, many=True, context={'request': request})
 
         grouped_data = defaultdict(list)
-        for item in serializer.data:
-            category_name = VersusItem.objects.get(id=item['id']).product.category.name
-            grouped_data[category_name].append(item)
+        for versus_item, item in zip(versus_items, serializer.data):
+            grouped_data[versus_item.product.category.name].append(item)
 
         return Response(grouped_data)
 
@@ -503,6 +804,7 @@ class VersusItemListAPIView(APIView):
 class VersusItemCreateAPIView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = VersusItemSerializer
+    throttle_classes = [UserWriteThrottle, IPWriteThrottle]
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -518,6 +820,8 @@ class VersusItemDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = VersusItemSerializer
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return VersusItem.objects.none()
         return VersusItem.objects.filter(user=self.request.user)
 
     def perform_update(self, serializer):
@@ -531,20 +835,106 @@ class VersusItemDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         instance.delete()
 
 
-class MessageListAPIView(APIView):
+class MessageListAPIView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
-    pagination_class = CustomPageNumberPagination
+    serializer_class = MessageSerializer
+    pagination_class = MessageCursorPagination
 
-    def get(self, request, *args, **kwargs):
-        messages = Message.objects.filter(user=request.user)
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        if not self.request.user.is_authenticated:
+            return Message.objects.none()
+        return Message.objects.filter(user=self.request.user)
+
+
+async def message_request_user(request):
+    # DRF async view'larni qo'llamaydi, shu sabab JWT va sessiyani qo'lda tekshiramiz.
+    # Shaxsiy xabarlar: faqat claim'lar yetmaydi, is_active ham tekshirilishi kerak
+    try:
+        result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    if result is not None:
+        return result[0]
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def message_after(request):
+    value = request.GET.get('after') or request.headers.get('Last-Event-ID') or 0
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class MessagePollView(View):
+    """
+    Long-poll: ``GET /messages/poll/?after=<id>&timeout=<s>`` answers as soon
+    as messages newer than ``after`` exist, or with an empty list on timeout.
+    """
+
+    async def get(self, request):
+        user = await message_request_user(request)
+        if user is None:
+            return JsonResponse({'detail': "Autentifikatsiya talab qilinadi."}, status=401)
+        after = message_after(request)
+        if after is None:
+            return JsonResponse({'after': "Butun son bo'lishi kerak."}, status=400)
+        try:
+            timeout = min(float(request.GET.get('timeout', settings.MESSAGE_STREAM['LONG_POLL_TIMEOUT'])),
+                          settings.MESSAGE_STREAM['LONG_POLL_TIMEOUT'])
+        except ValueError:
+            return JsonResponse({'timeout': "Son bo'lishi kerak."}, status=400)
+
+        messages = await wait_for_messages(user.id, after, max(timeout, 0))
+        return JsonResponse({
+            'last_id': messages[-1].pk if messages else after,
+            'results': MessageSerializer(messages, many=True, context={'request': request}).data,
+        })
+
+
+class MessageStreamView(View):
+    """
+    Server-sent events: one ``message`` event per new row, ``id`` set to the
+    message id so EventSource resumes from ``Last-Event-ID`` on reconnect.
+    """
+
+    async def get(self, request):
+        user = await message_request_user(request)
+        if user is None:
+            return JsonResponse({'detail': "Autentifikatsiya talab qilinadi."}, status=401)
+        after = message_after(request)
+        if after is None:
+            return JsonResponse({'after': "Butun son bo'lishi kerak."}, status=400)
+
+        response = StreamingHttpResponse(self.events(request, user.id, after), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, request, user_id, after):
+        options = settings.MESSAGE_STREAM
+        deadline = time.monotonic() + options['STREAM_TIMEOUT']
+        yield 'retry: 3000\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            messages = await wait_for_messages(user_id, after, min(options['HEARTBEAT'], remaining))
+            if not messages:
+                yield ': ping\n\n'
+                continue
+            data = MessageSerializer(messages, many=True, context={'request': request}).data
+            for message, item in zip(messages, data):
+                yield f'id: {message.pk}\nevent: message\ndata: {json.dumps(item, cls=DjangoJSONEncoder)}\n\n'
+            after = messages[-1].pk
 
 
 class MessageCreateAPIView(generics.CreateAPIView):
     queryset = Message.objects.all()
     permission_classes = [IsAuthenticated]
     serializer_class = MessageSerializer
+    throttle_classes = [UserWriteThrottle, IPWriteThrottle]
 
 
 class MessageDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
@@ -558,17 +948,123 @@ class MessageDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         return Message.objects.filter(user=self.request.user)
 
 
-class PropertyTypeListCreateView(generics.ListCreateAPIView):
-    queryset = PropertyType.objects.all()
+UPLOAD_TARGETS = {
+    'image': (ImageSerializer, 'image'),
+    'message': (MessageSerializer, 'file'),
+}
+
+
+class UploadCreateAPIView(generics.CreateAPIView):
+    """Starts a chunked upload session; chunks then go to ``PUT /uploads/<id>/``."""
+    serializer_class = UploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        start_upload(serializer.save(user=self.request.user))
+
+
+class UploadDetailAPIView(APIView):
+    """
+    ``GET`` reports the received offset for resuming, ``PUT`` appends a chunk
+    (``Content-Range: bytes <start>-<end>/<size>`` or ``?offset=``), ``DELETE``
+    drops the session. The body is streamed to disk, never parsed.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        return get_object_or_404(Upload, pk=self.kwargs['pk'], user=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        return Response(UploadSerializer(self.get_object()).data)
+
+    def put(self, request, *args, **kwargs):
+        upload = self.get_object()
+        chunk = self.get_chunk_range(request, upload)
+        if chunk is None:
+            return Response({"detail": "Content-Range noto'g'ri."}, status=status.HTTP_400_BAD_REQUEST)
+        start, length = chunk
+        if length > settings.CHUNKED_UPLOADS['MAX_CHUNK_SIZE']:
+            return Response({"detail": "Bo'lak juda katta."}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        try:
+            write_chunk(upload, start, length, request.stream)
+        except UploadConflict:
+            upload.refresh_from_db(fields=['offset'])
+            return Response({"detail": "Bo'lak joriy offsetdan boshlanishi kerak.", "offset": upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+        except UploadInterrupted:
+            return Response({"detail": "Bo'lak to'liq kelmadi.", "offset": start}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSerializer(upload).data)
+
+    def delete(self, request, *args, **kwargs):
+        discard_upload(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @staticmethod
+    def get_chunk_range(request, upload):
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            header = request.headers.get('Content-Range')
+            if header:
+                unit, _, spec = header.partition(' ')
+                bounds, _, total = spec.partition('/')
+                first, _, last = bounds.partition('-')
+                start = int(first)
+                if unit != 'bytes' or int(last) - start + 1 != length or total not in ('*', str(upload.size)):
+                    return None
+            else:
+                start = int(request.query_params.get('offset', upload.offset))
+        except ValueError:
+            return None
+        if length <= 0 or start < 0 or start + length > upload.size:
+            return None
+        return start, length
+
+
+class UploadFinalizeAPIView(APIView):
+    """
+    Creates the target object (``Image`` or ``Message``) from the request
+    fields and moves the uploaded file into it.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        upload = get_object_or_404(Upload, pk=kwargs['pk'], user=request.user)
+        if upload.offset != upload.size:
+            return Response({"detail": "Yuklash hali tugamagan.", "offset": upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+        if upload.target == 'image' and not IsAdmin().has_permission(request, self):
+            raise PermissionDenied("Rasm yuklash faqat admin uchun.")
+
+        serializer_class, field_name = UPLOAD_TARGETS[upload.target]
+        data = request.data.copy()
+        data.pop(field_name, None)
+        if upload.target == 'message':
+            data['user'] = request.user.pk
+        serializer = serializer_class(data=data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        instance = serializer_class.Meta.model(**serializer.validated_data)
+        try:
+            digest = attach_upload(upload, instance, field_name)
+        except UploadConflict:
+            return Response({"detail": "Yuklash allaqachon yakunlangan."}, status=status.HTTP_409_CONFLICT)
+
+        data = serializer_class(instance, context={'request': request}).data
+        return Response(dict(data, sha256=digest), status=status.HTTP_201_CREATED)
+
+
+class PropertyTypeListCreateView(CatalogCacheMixin, ReplicaReadMixin, generics.ListCreateAPIView):
+    queryset = PropertyType.objects.prefetch_related('property_set')
     serializer_class = PropertyTypeSerializer
     permission_classes = (AllowAny,)
 
 class PropertyTypeDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = PropertyType.objects.all()
+    queryset = PropertyType.objects.prefetch_related('property_set')
     serializer_class = PropertyTypeSerializer
     permission_classes = (AllowAny,)
 
-class PropertyListCreateView(generics.ListCreateAPIView):
+class PropertyListCreateView(CatalogCacheMixin, ReplicaReadMixin, generics.ListCreateAPIView):
     queryset = Property.objects.all()
     serializer_class = PropertySerializer
     permission_classes = (AllowAny,)